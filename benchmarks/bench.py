@@ -0,0 +1,384 @@
+"""Benchmarks of chaos game stages on fixed scenes with fixed seeds.
+
+Times `div_in_rel` per branch, every checker mode, `Mid3D.get_coords`,
+`clean` and `Exporter2D` backends. Results are written as JSON and compared
+with the stored baseline, slower than baseline by more than tolerance is a
+regression.
+
+Run from the repository root:
+
+    $ uv run python benchmarks/bench.py
+    $ uv run python benchmarks/bench.py --only div_in_rel --quick
+    $ uv run python benchmarks/bench.py --update-baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+from cmath import exp
+from math import pi
+from pathlib import Path
+from time import perf_counter
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+os.environ.setdefault('MPLBACKEND', 'Agg')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np  # noqa: E402
+from pyqtgraph.parametertree import Parameter  # noqa: E402
+
+from Iterate2D import Worker2D  # noqa: E402
+from Point import Point, Point3  # noqa: E402
+from SpecialFunctions import phi_big  # noqa: E402
+from Utility import isclose_prec  # noqa: E402
+
+BASELINE = Path(__file__).resolve().parent / 'baseline.json'
+
+SEED = 2024
+
+# Default scene of params.json
+TRIANGLE = [Point3(2, 0, 1), Point3(4, 2, 1), Point3(4, -2, 1)]
+
+# Regular n-gon of README, step counts keep every scene around a second
+NGONS = {6: 2000, 50: 300, 500: 10}
+
+# Cube in affine chart of projective space
+CUBE = [Point(x, y, z, 1) for x in (-0.3, 0.3)
+        for y in (-0.3, 0.3) for z in (-0.3, 0.3)]
+
+CHECKERS = ('shapely & polygon', 'shapely', 'polygon')
+
+
+def ngon(n: int, c=complex(0, -3), r=2) -> list[Point3]:
+    """Vertices of regular n-gon as in README."""
+    points = [c + r**2 * exp(1j * (2 * pi * k) / n) for k in range(n)]
+
+    return [Point3(z.real, z.imag, 1) for z in points]
+
+
+def seed_all(seed=SEED):
+    """Seed global random sources, see make_worker for workers."""
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def make_worker(vertices, algorithm='shapely & polygon') -> Worker2D:
+    """Worker configured as the GUI does with default parameters."""
+    seed_all()
+
+    worker = Worker2D()
+    # Workers have their own generator, seed_all doesn't reach it
+    worker.random.seed(SEED)
+    worker.vertices = vertices
+    worker.xmin, worker.xmax, worker.ymin, worker.ymax = worker.guess_limits()
+
+    worker.prepare_shapely_checker()
+    worker.start_point = worker.gen_start_point()
+    worker.prepare_polygon_checker()
+
+    worker.vertices_colors = ['#000000'] * len(vertices)
+
+    checkers = {'shapely & polygon': worker.checker,
+                'shapely': worker.shapely_default_checker,
+                'polygon': worker.polygon_default_checker}
+    worker.algorithm = algorithm
+    worker.checker = checkers[algorithm]
+
+    return worker
+
+
+def timeit(function, repeats: int) -> float:
+    """Median seconds of function call."""
+    times = []
+    for _ in range(repeats):
+        seed_all()
+
+        start = perf_counter()
+        function()
+        times.append(perf_counter() - start)
+
+    return statistics.median(times)
+
+
+def branch_of(m, b) -> str:
+    """Branch of div_in_rel taken for m, b."""
+    val = phi_big(m, b)
+    if val > 0:
+        return 'elliptic'
+    if isclose_prec(abs(val), 0):
+        return 'parabolic'
+
+    return 'hyperbolic'
+
+
+def bench_div_in_rel(scale: float, repeats: int) -> dict:
+    """Microseconds per div_in_rel call by scene and branch."""
+    results = {}
+    scenes = {'triangle': (TRIANGLE, 2000)}
+    scenes |= {f'ngon{n}': (ngon(n), steps) for n, steps in NGONS.items()}
+
+    for scene, (vertices, steps) in scenes.items():
+        worker = make_worker(vertices)
+
+        # Record real arguments of the game
+        calls = []
+        original = worker.div_in_rel
+
+        def record(m, b, rel=1, inside=True, original=original, calls=calls):
+            calls.append((m, b))
+            return original(m, b, rel=rel, inside=inside)
+
+        worker.div_in_rel = record
+        worker.work(max(int(steps * scale), 1))
+        worker.div_in_rel = original
+
+        by_branch = {}
+        for m, b in calls:
+            by_branch.setdefault(branch_of(m, b), []).append((m, b))
+
+        for branch, pairs in sorted(by_branch.items()):
+            seconds = timeit(
+                lambda pairs=pairs: [original(m, b) for m, b in pairs],
+                repeats,
+            )
+            results[f'div_in_rel/{scene}/{branch}'] = {
+                'value': 1e6 * seconds / len(pairs),
+                'unit': 'us/call',
+                'calls': len(pairs),
+            }
+
+    return results
+
+
+def bench_checkers(scale: float, repeats: int) -> dict:
+    """Microseconds per game step by scene and checker mode."""
+    results = {}
+    scenes = {'triangle': (TRIANGLE, 2000)}
+    scenes |= {f'ngon{n}': (ngon(n), steps) for n, steps in NGONS.items()}
+
+    for scene, (vertices, steps) in scenes.items():
+        steps = max(int(steps * scale), 1)
+
+        for algorithm in CHECKERS:
+            worker = make_worker(vertices, algorithm)
+            start_point = worker.start_point
+
+            def run(worker=worker, start_point=start_point, steps=steps):
+                worker.start_point = start_point
+                worker.work(steps)
+
+            results[f'checker/{scene}/{algorithm}'] = {
+                'value': 1e6 * timeit(run, repeats) / steps,
+                'unit': 'us/step',
+            }
+
+    return results
+
+
+def bench_get_coords(scale: float, repeats: int) -> dict:
+    """Microseconds per Mid3D.get_coords call on the cube."""
+    from Iterate3D import Worker3D
+    from Mid3D import get_coords
+
+    seed_all()
+
+    worker = Worker3D()
+    worker.vertices = CUBE
+    worker.start_point = worker.gen_start_point()
+    worker.vertices_colors = ['#000000'] * len(CUBE)
+
+    pairs = []
+    original = worker.div_in_rel
+
+    def record(vertex, cur, rel=1, inside=True):
+        pairs.append((vertex, cur))
+        return original(vertex, cur, rel=rel, inside=inside)
+
+    worker.div_in_rel = record
+    worker.work(max(int(300 * scale), 1), rel=1)
+
+    seconds = timeit(lambda: [get_coords(a, b, 1) for a, b in pairs], repeats)
+
+    return {'get_coords/cube': {'value': 1e6 * seconds / len(pairs),
+                                'unit': 'us/call'}}
+
+
+def bench_clean(scale: float, repeats: int) -> dict:
+    """Milliseconds of clean (dedup) of random points."""
+    worker = Worker2D()
+
+    rng = np.random.default_rng(SEED)
+    n = max(int(10**6 * scale), 1)
+    # Every point is repeated about twice after rounding
+    x = np.round(rng.uniform(0, 1, n), 3)
+    y = np.round(rng.uniform(0, 1, n), 3)
+    indices = rng.integers(0, 3, n, dtype=np.int32)
+
+    seconds = timeit(lambda: worker.clean(x, y, indices), repeats)
+
+    return {'clean/uniform': {'value': 1e3 * seconds, 'unit': 'ms',
+                              'points': n}}
+
+
+def load_params() -> tuple[Parameter, Parameter]:
+    """Parameter trees from params.json as in the GUI."""
+    with (ROOT / 'params.json').open(encoding='utf-8') as f:
+        config = json.load(f)
+
+    def create(name):
+        children = []
+        for item in config[name]:
+            if item['type'] == 'list' and 'limits' in item:
+                limits = item.pop('limits')
+                param = Parameter.create(**item)
+                param.setLimits(limits)
+                children.append(param)
+            else:
+                children.append(item)
+
+        return Parameter.create(name=name, type='group', children=children)
+
+    return create('Параметры'), create('Экспорт')
+
+
+def bench_export(scale: float, repeats: int) -> dict:
+    """Seconds of every export backend on the triangle attractor."""
+    from Exporter import Exporter2D
+
+    worker = make_worker(TRIANGLE)
+
+    # Game is slow, attractor of the triangle is sampled by its IFS
+    rng = np.random.default_rng(SEED)
+    n = max(int(2 * 10**5 * scale), 1)
+    corners = np.array([[2, 0], [4, 2], [4, -2]], dtype=float)
+    choice = rng.integers(0, 3, n)
+    points = np.empty((n, 2))
+    cur = corners.mean(axis=0)
+    for i, k in enumerate(choice):
+        cur = (cur + corners[k]) / 2
+        points[i] = cur
+
+    colors = np.array(['#000000', '#ff0000', '#0000ff'])[choice]
+
+    backends = {
+        'png': ('bench.png', 0),
+        'pdf_raster': ('bench.pdf', 0),
+        'tiled_tiff': ('bench.tif', 4096),
+        'tiled_png': ('bench.png', 4096),
+    }
+
+    params, params_exp = load_params()
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        params_exp.child('Директория по умолчанию').setValue(directory)
+        params_exp.child('dpi').setValue(150)
+        params_exp.child('Размер тайла').setValue(1024)
+
+        for name, (file_name, tiled_width) in backends.items():
+            params_exp.child('Имя файла').setValue(file_name)
+            params_exp.child('Ширина изображения (тайлы)').setValue(tiled_width)
+
+            def run():
+                Exporter2D(worker, params, params_exp,
+                           points[:, 0], points[:, 1], colors,
+                           lamb=1.0).run()
+
+            results[f'export/{name}'] = {'value': timeit(run, repeats),
+                                         'unit': 's',
+                                         'points': n}
+
+    return results
+
+
+SUITES = {
+    'div_in_rel': bench_div_in_rel,
+    'checker': bench_checkers,
+    'get_coords': bench_get_coords,
+    'clean': bench_clean,
+    'export': bench_export,
+}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Benchmarks slower than baseline by more than tolerance.
+
+    Returns:
+        list[str]: human readable regressions
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        old = baseline[name]['value']
+        new = result['value']
+        if old > 0 and new > old * (1 + tolerance):
+            regressions.append(f'{name}: {old:.3f} -> {new:.3f} {result["unit"]}'
+                               f' (+{100 * (new / old - 1):.0f}%)')
+
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--only', nargs='*', choices=SUITES, default=list(SUITES),
+                        help='suites to run')
+    parser.add_argument('--quick', action='store_true',
+                        help='smaller sizes, for smoke runs')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='runs of every benchmark, median is taken')
+    parser.add_argument('--output', type=Path,
+                        default=Path('bench_results.json'),
+                        help='where to write results')
+    parser.add_argument('--baseline', type=Path, default=BASELINE,
+                        help='results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown, part of baseline')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='store results as the new baseline')
+    args = parser.parse_args()
+
+    scale = 0.1 if args.quick else 1.0
+
+    results = {}
+    for name in args.only:
+        results |= SUITES[name](scale, args.repeats)
+
+    for name, result in results.items():
+        print(f'{name:45} {result["value"]:12.3f} {result["unit"]}')
+
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'quick': args.quick,
+        'results': results,
+    }
+    args.output.write_text(json.dumps(report, indent=4), encoding='utf-8')
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(report, indent=4), encoding='utf-8')
+        return 0
+
+    if not args.baseline.exists():
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+    if baseline.get('quick') != args.quick:
+        print('baseline has other sizes, not compared')
+        return 0
+
+    regressions = compare(results, baseline['results'], args.tolerance)
+    for line in regressions:
+        print(f'regression: {line}')
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
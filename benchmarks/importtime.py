@@ -0,0 +1,121 @@
+"""Cold start regression check based on ``python -X importtime``.
+
+Builds the main window in a fresh interpreter and sums import times of all
+modules imported on the way. Fails if the sum exceeds the budget or if one
+of the modules that should be imported on demand shows up at startup.
+
+Run from the repository root:
+
+    $ uv run python benchmarks/importtime.py --budget 600
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Milliseconds, measured on a thin client
+BUDGET_MS = 600
+
+# Imported only by the feature that needs them
+DEFERRED = [
+    'matplotlib',
+    'mpmath',
+    'pyqtgraph.opengl',
+    'scipy',
+    'shapely',
+]
+
+STARTUP = f'''
+import json
+import sys
+
+import Gui
+
+app = Gui.Application()
+print(json.dumps([m for m in {DEFERRED!r} if m in sys.modules]))
+'''
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """Parse ``-X importtime`` output.
+
+    Args:
+        stderr (str): stderr of the interpreter
+
+    Returns:
+        list[tuple[str, int, int]]: (module, self us, cumulative us)
+    """
+    result = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            # header
+            continue
+
+        result.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    return result
+
+
+def measure() -> tuple[list[tuple[str, int, int]], list[str]]:
+    """Start application in a fresh interpreter.
+
+    Returns:
+        tuple: parsed import times and deferred modules that were imported
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = str(ROOT / 'src')
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    loaded = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    return parse_importtime(proc.stderr), loaded
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget', type=float, default=BUDGET_MS,
+                        help='cold start import budget, ms')
+    parser.add_argument('--top', type=int, default=10,
+                        help='number of the slowest modules to show')
+    args = parser.parse_args()
+
+    times, loaded = measure()
+
+    total_ms = sum(self_us for _, self_us, _ in times) / 1000
+
+    print(f'imports: {total_ms:.1f} ms (budget {args.budget:.1f} ms)')
+    for name, _, cumulative_us in sorted(times, key=lambda t: -t[2])[:args.top]:
+        print(f'{cumulative_us / 1000:10.1f} ms  {name}')
+
+    ok = True
+    if loaded:
+        print(f'imported at startup, should be deferred: {", ".join(loaded)}')
+        ok = False
+
+    if total_ms > args.budget:
+        print('import budget exceeded')
+        ok = False
+
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
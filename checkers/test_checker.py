@@ -1,5 +1,12 @@
-from point import Point2
+import numpy as np
+
+from Point import Point2
 
 
 def checker(p: Point2) -> bool:
     return p.x > 1 and p.y > 1
+
+
+# Same region on coordinate arrays, checked in batches
+def region(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    return (x > 1) & (y > 1)
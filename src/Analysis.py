@@ -0,0 +1,228 @@
+"""Analysis of chaos game results: box-counting dimension."""
+
+from dataclasses import dataclass
+
+import numpy as np
+from pyqtgraph.Qt.QtCore import QObject, pyqtSignal
+
+from Dedup import SortedKeys
+
+# Boxes of side 2**-levels of the bounding cube at the finest scale
+LEVELS = 16
+
+# Scales with fewer boxes are too coarse, with more than this part of
+# boxes of the finest scale are too fine (every point in its own box)
+# to fit the slope
+MIN_BOXES = 16
+MAX_BOXES_PART = 0.1
+
+# Boxes of stores hold this many points on average at the finest scale,
+# finer scales are dropped, as keys would take as much as the points
+STORE_POINTS_PER_BOX = 8
+
+
+@dataclass
+class BoxCounting:
+    """Box counts by scale and the fitted dimension."""
+
+    # Side of box at every scale, from the coarsest one
+    sizes: np.ndarray
+    # Number of nonempty boxes at every scale
+    counts: np.ndarray
+    # Scales used in the fit, first and last index
+    fit: tuple[int, int]
+    dimension: float
+
+    def summary(self) -> str:
+        """One line human readable summary."""
+        first, last = self.fit
+
+        return f'box dimension: {self.dimension:.4f} '\
+            f'(boxes {self.counts[first]}..{self.counts[last]})'
+
+
+def box_counts(*coords, levels=LEVELS) -> tuple[np.ndarray, np.ndarray]:
+    """Number of nonempty boxes at every dyadic scale.
+
+    Points are quantized once at the finest scale into Morton keys (bits
+    of box indices interleaved), so the box of the next coarser scale is
+    the key shifted by the number of axes. Keys are sorted once, every
+    scale is then counted by comparing neighbours.
+
+    Args:
+        *coords (np.ndarray): x, y or x, y, z coordinates
+        levels (int, optional): number of scales. Defaults to LEVELS.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: sides of boxes and counts,
+            from the coarsest scale
+    """
+    return chunked_box_counts(lambda: iter([coords]), levels=levels)
+
+
+def store_box_counts(store, names=('x', 'y'),
+                     levels=LEVELS) -> tuple[np.ndarray, np.ndarray]:
+    """Box counts of points on disk, see box_counts.
+
+    Args:
+        store (PointStore): points
+        names (tuple, optional): columns of coordinates.
+            Defaults to ('x', 'y').
+        levels (int, optional): number of scales, the finest ones are
+            dropped while boxes hold fewer than STORE_POINTS_PER_BOX
+            points. Defaults to LEVELS.
+    """
+    return chunked_box_counts(lambda: store.chunks(*names), levels=levels,
+                              max_boxes=len(store) // STORE_POINTS_PER_BOX)
+
+
+def chunked_box_counts(chunks, levels=LEVELS,
+                       max_boxes=None) -> tuple[np.ndarray, np.ndarray]:
+    """Box counts of points that come in chunks.
+
+    The first pass finds the bounding cube, the second one merges distinct
+    keys of every chunk into SortedKeys, so memory is bounded by the number
+    of boxes at the finest scale, not by the number of points.
+
+    Args:
+        chunks (Callable): returns iterator over tuples of coordinates,
+            called once for every pass
+        levels (int, optional): number of scales. Defaults to LEVELS.
+        max_boxes (int, optional): the finest scale is dropped whenever it
+            has more boxes, e.g. so that it isn't one box per point.
+            Defaults to None.
+    """
+    lows, highs = None, None
+    for coords in chunks():
+        finite = np.logical_and.reduce([np.isfinite(c) for c in coords])
+        if not finite.any():
+            continue
+
+        low = [np.asarray(c)[finite].min() for c in coords]
+        high = [np.asarray(c)[finite].max() for c in coords]
+        lows = low if lows is None else np.minimum(lows, low)
+        highs = high if highs is None else np.maximum(highs, high)
+
+    if lows is None:
+        return np.empty(0), np.empty(0, dtype=np.int64)
+
+    dim = len(lows)
+    bits = min(levels, 63 // dim)
+
+    # Boxes are cubes, so common side for all axes
+    side = float(max(np.subtract(highs, lows))) or 1.0
+
+    boxes = SortedKeys()
+    for coords in chunks():
+        coords = [np.asarray(c, dtype=float) for c in coords]
+        finite = np.logical_and.reduce([np.isfinite(c) for c in coords])
+
+        n = 2**bits
+        keys = np.zeros(np.count_nonzero(finite), dtype=np.int64)
+        for axis, (c, low) in enumerate(zip(coords, lows, strict=True)):
+            q = np.minimum(((c[finite] - low) * (n / side)).astype(np.int64),
+                           n - 1)
+            for bit in range(bits):
+                keys |= ((q >> bit) & 1) << (bit * dim + axis)
+
+        boxes.update(keys)
+
+        while max_boxes is not None and len(boxes) > max_boxes and bits > 1:
+            # Keys of the next coarser scale
+            boxes.map(lambda keys: keys >> dim)
+            bits -= 1
+
+    # Levels below shift keys in place
+    keys = boxes.array().copy()
+    boxes.clear()
+
+    sizes, counts = [], []
+    for level in range(bits, 0, -1):
+        # Sorted keys stay sorted after shift, boxes are runs of equal keys
+        first = np.empty(len(keys), dtype=bool)
+        first[0] = True
+        np.not_equal(keys[1:], keys[:-1], out=first[1:])
+        keys = keys[first]
+
+        sizes.append(side / 2**level)
+        counts.append(len(keys))
+
+        keys >>= dim
+
+    return np.array(sizes[::-1]), np.array(counts[::-1], dtype=np.int64)
+
+
+def box_dimension(*coords, levels=LEVELS) -> BoxCounting | None:
+    """Box-counting dimension of point set.
+
+    Slope of log count against log of inverse box side, fitted over
+    scales that are neither too coarse nor saturated by points.
+
+    Args:
+        *coords (np.ndarray): x, y or x, y, z coordinates
+        levels (int, optional): number of scales. Defaults to LEVELS.
+
+    Returns:
+        BoxCounting | None: None if fewer than two scales are neither too
+            coarse nor saturated, e.g. too few points
+    """
+    return fit_dimension(*box_counts(*coords, levels=levels))
+
+
+def store_dimension(store, names=('x', 'y'),
+                    levels=LEVELS) -> BoxCounting | None:
+    """Box-counting dimension of points on disk, see box_dimension."""
+    return fit_dimension(*store_box_counts(store, names, levels=levels))
+
+
+def fit_dimension(sizes, counts) -> BoxCounting | None:
+    """Fit slope of box counts, see box_dimension."""
+    if len(counts) < 2:
+        return None
+
+    # Slope of saturated or too coarse scales means nothing
+    usable = (counts >= MIN_BOXES) & (counts <= MAX_BOXES_PART * counts[-1])
+    if np.count_nonzero(usable) < 2:
+        return None
+
+    idx = np.flatnonzero(usable)
+    slope, _ = np.polyfit(-np.log2(sizes[idx]), np.log2(counts[idx]), 1)
+
+    return BoxCounting(sizes, counts, (int(idx[0]), int(idx[-1])), float(slope))
+
+
+class AnalysisSignals(QObject):
+    """Defines the signals available from a running analysis.
+
+    Supported signals are:
+
+    result
+        BoxCounting or None
+
+    """
+
+    result = pyqtSignal(object)
+
+
+class DimensionJob:
+    """Scheduler job that estimates box-counting dimension."""
+
+    def __init__(self, *coords, store=None):
+        """Keep points.
+
+        Args:
+            *coords (np.ndarray): x, y or x, y, z coordinates
+            store (PointStore, optional): points on disk, used instead of
+                coords. Defaults to None.
+        """
+        self.coords = coords
+        self.store = store
+        self.signals = AnalysisSignals()
+
+    def run(self):
+        """Run analysis in Scheduler."""
+        if self.store is not None:
+            self.signals.result.emit(store_dimension(self.store))
+            return
+
+        self.signals.result.emit(box_dimension(*self.coords))
@@ -0,0 +1,282 @@
+"""Animation export: chaos game with parameters changing from frame to frame."""
+
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from matplotlib.colors import to_rgba_array
+from pyqtgraph.Qt.QtCore import QObject, pyqtSignal
+
+from Exporter import Exporter2D
+from Point import Point3
+from Raster import color_index, palette_index, render
+
+VIDEO_SUFFIXES = ('.mp4', '.mkv', '.webm', '.avi', '.mov')
+
+
+class AnimationSignals(QObject):
+    """Defines the signals available from a running animation export.
+
+    Supported signals are:
+
+    progress
+        number of written frames, total number of frames
+
+    finished
+        returns no data
+    """
+
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal()
+
+
+class ImageSequence:
+    """Writes frames as numbered PNG files."""
+
+    def __init__(self, path):
+        """Remember where to write.
+
+        Args:
+            path (str | Path): frames are named <stem>_<number>.png
+        """
+        self.path = Path(path)
+        self.cnt = 0
+
+    def write(self, frame):
+        """Write next frame.
+
+        Args:
+            frame (np.ndarray): (h, w, 4) uint8 image
+        """
+        from PIL import Image
+
+        name = f'{self.path.stem}_{self.cnt:05d}.png'
+        Image.fromarray(frame, 'RGBA').save(self.path.with_name(name))
+
+        self.cnt += 1
+
+    def close(self):
+        """Nothing to finish."""
+
+
+class VideoPipe:
+    """Writes frames to video through local ffmpeg."""
+
+    def __init__(self, path, width: int, height: int, fps: int):
+        """Start encoder.
+
+        Args:
+            path (str | Path): output video
+            width (int): frame width, even
+            height (int): frame height, even
+            fps (int): frames per second
+        """
+        self.process = subprocess.Popen(
+            [shutil.which('ffmpeg'), '-y', '-loglevel', 'error',
+             '-f', 'rawvideo', '-pix_fmt', 'rgba',
+             '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+             '-pix_fmt', 'yuv420p', str(path)],
+            stdin=subprocess.PIPE,
+        )
+
+    def write(self, frame):
+        """Write next frame.
+
+        Args:
+            frame (np.ndarray): (h, w, 4) uint8 image
+        """
+        self.process.stdin.write(np.ascontiguousarray(frame).tobytes())
+
+    def close(self):
+        """Finish encoding."""
+        self.process.stdin.close()
+        self.process.wait()
+
+
+class AnimationExporter(Exporter2D):
+    """Export frames with lambda and vertices interpolated between two values.
+
+    Every frame warm starts its chains from points of the previous frame's
+    attractor, so there is no transient and no cold reruns. Frames are
+    rasterized without matplotlib in a pool of threads and streamed in
+    order to PNG sequence or, if the file name has video extension and
+    ffmpeg is installed, to video.
+    """
+
+    def __init__(
+            self,
+            worker,
+            params,
+            params_exp,
+            vertices_end,
+            lambdas,
+            cnt,
+        ):
+        """Parse params for future exporting.
+
+        Args:
+            worker (Worker2D): configured worker, its vertices are the
+                first frame
+            params (Parameter): 'Параметры' tree
+            params_exp (Parameter): 'Экспорт' tree
+            vertices_end (list[Point3]): vertices of the last frame
+            lambdas (tuple[float, float]): lambda of the first and the
+                last frame
+            cnt (int): number of iterations per frame
+        """
+        super().__init__(worker, params, params_exp,
+                         np.array([]), np.array([]), np.array([]),
+                         lamb=lambdas[0])
+        self.signals = AnimationSignals()
+
+        self.vertices_start = list(worker.vertices)
+        self.vertices_end = vertices_end
+        self.lambdas = lambdas
+        self.cnt = cnt
+
+        self.frames = max(params_exp.child('Кадры анимации').value(), 1)
+        self.frame_width = params_exp.child('Ширина кадра').value()
+        self.fps = params_exp.child('Частота кадров').value()
+        self.chains = 8
+
+    def run(self):
+        """Run export in Scheduler."""
+        self.export_animation()
+
+        self.signals.finished.emit()
+
+    def frame_settings(self, idx: int) -> tuple[list[Point3], float]:
+        """Interpolated vertices and lambda of frame.
+
+        Returns:
+            tuple[list[Point3], float]: vertices, lambda
+        """
+        t = idx / (self.frames - 1) if self.frames > 1 else 0
+
+        vertices = [
+            Point3(*[(1 - t) * a + t * b for a, b in zip(v, w, strict=True)])
+            for v, w in zip(self.vertices_start, self.vertices_end, strict=True)
+        ]
+        rel = (1 - t) * self.lambdas[0] + t * self.lambdas[1]
+
+        return vertices, rel
+
+    def warm_starts(self, x, y) -> list[Point3]:
+        """Starting points of chains taken from previous frame.
+
+        Args:
+            x (np.ndarray): x coordinates of previous frame
+            y (np.ndarray): y coordinates of previous frame
+
+        Returns:
+            list[Point3]: starting points inside current polygon
+        """
+        if not len(x):
+            return self.worker.gen_start_points(self.chains)
+
+        rng = np.random.default_rng(self.worker.random.getrandbits(64))
+        starts = [Point3(x[i], y[i], 1)
+                  for i in rng.integers(len(x), size=self.chains)]
+        bad = [i for i, point in enumerate(starts)
+               if self.worker.checker(point) != self.worker.inside]
+        for i, point in zip(bad, self.worker.gen_start_points(len(bad)),
+                            strict=True):
+            starts[i] = point
+
+        return starts
+
+    def compute_frame(self, idx: int, x, y):
+        """Play chaos game for frame.
+
+        Args:
+            idx (int): frame number
+            x (np.ndarray): x coordinates of previous frame
+            y (np.ndarray): y coordinates of previous frame
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: x, y, colors
+        """
+        worker = self.worker
+        worker.vertices, rel = self.frame_settings(idx)
+        worker.prepare_shapely_checker()
+        # Warm starts are checked against polygon of this frame
+        worker.start_point = worker.gen_start_point()
+        worker.prepare_polygon_checker()
+
+        result = []
+        for start in self.warm_starts(x, y):
+            worker.start_point = start
+            worker.prepare_polygon_checker()
+
+            x, y, indices = worker.work(self.cnt // self.chains, rel=rel)
+            result.append((x, y, worker.colorize(indices)))
+
+        return tuple(np.concatenate(parts) for parts in zip(*result, strict=True))
+
+    def export_animation(self):
+        """Compute frames one after another and stream them to output."""
+        if not self.file_name:
+            return
+
+        xmin, xmax = self.worker.xmin, self.worker.xmax
+        ymin, ymax = self.worker.ymin, self.worker.ymax
+        extent = (xmin, xmax, ymin, ymax)
+
+        # Even sizes for yuv420p
+        width = self.frame_width // 2 * 2
+        height = max(round(width * (ymax - ymin) / (xmax - xmin)) // 2 * 2, 2)
+
+        # Frames are small, export dpi would make points blobs: sizes are
+        # in frame pixels, a point per pixel
+        radius = np.sqrt(self.point_size) / 2
+
+        palette, _ = color_index(self.worker.vertices_colors)
+        palette_rgba = np.round(to_rgba_array(palette) * 255)
+
+        path = self.output_path()
+        if path.suffix.lower() in VIDEO_SUFFIXES and shutil.which('ffmpeg'):
+            sink = VideoPipe(path, width, height, self.fps)
+        else:
+            sink = ImageSequence(path.with_suffix('.png'))
+
+        workers = os.cpu_count() or 1
+        pending = []
+        written = 0
+
+        x, y = np.array([]), np.array([])
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for idx in range(self.frames):
+                if self.cancelled:
+                    break
+
+                x, y, colors = self.compute_frame(idx, x, y)
+
+                pending.append(pool.submit(
+                    render,
+                    x,
+                    y,
+                    palette_index(colors, palette),
+                    palette_rgba,
+                    extent,
+                    width,
+                    height,
+                    radius=radius,
+                    lines=self.raster_lines(dpi=72),
+                ))
+
+                # Keep memory bounded, frames go out in order
+                while len(pending) > 2 * workers\
+                        or (pending and pending[0].done()):
+                    sink.write(pending.pop(0).result())
+
+                    written += 1
+                    self.signals.progress.emit(written, self.frames)
+
+            for future in pending:
+                sink.write(future.result())
+
+        sink.close()
+        self.signals.progress.emit(self.frames, self.frames)
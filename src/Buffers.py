@@ -0,0 +1,168 @@
+"""Growable typed arrays for points recorded by the game.
+
+Python lists keep every coordinate as a float object, 32 bytes plus
+the pointer, and the final conversion to numpy needs the whole list and
+the array at once. Buffers store values in numpy arrays from the start.
+Coordinates can be stored as float32 or quantized between known limits.
+"""
+
+import numpy as np
+
+# Capacity is multiplied by this when full
+GROWTH = 1.5
+
+# Capacity allocated before the first point, at most
+INITIAL_CAPACITY = 2**20
+
+# Storage of coordinates: dtype and whether it is quantized
+STORAGES = {
+    'float64': (np.float64, False),
+    'float32': (np.float32, False),
+    'int32': (np.int32, True),
+    'int16': (np.int16, True),
+}
+
+
+class Buffer:
+    """Array that grows as values are appended."""
+
+    def __init__(self, dtype=np.float64, capacity=INITIAL_CAPACITY):
+        """Create empty buffer.
+
+        Args:
+            dtype (np.dtype, optional): type of values.
+                Defaults to np.float64.
+            capacity (int, optional): values allocated before the first
+                one, e.g. expected number. Defaults to INITIAL_CAPACITY.
+        """
+        self.data = np.empty(max(int(capacity), 1), dtype=dtype)
+        self.size = 0
+
+    def __len__(self) -> int:
+        """Number of values appended."""
+        return self.size
+
+    def clear(self):
+        """Drop values.
+
+        Next values go to a new array as large as the dropped values, old
+        one is left to views of it, e.g. points sent to other thread.
+        """
+        self.data = np.empty(max(self.size, 1), dtype=self.data.dtype)
+        self.size = 0
+
+    def trim(self):
+        """Free capacity beyond values, e.g. before the final view."""
+        if len(self.data) > max(self.size, 1):
+            self.data = self.data[:self.size].copy()
+
+    def reserve(self, size: int):
+        """Grow so that size values fit."""
+        if size <= len(self.data):
+            return
+
+        capacity = max(size, int(len(self.data) * GROWTH))
+        data = np.empty(capacity, dtype=self.data.dtype)
+        data[:self.size] = self.data[:self.size]
+        self.data = data
+
+    def append(self, value):
+        """Append one value."""
+        if self.size == len(self.data):
+            self.reserve(self.size + 1)
+
+        self.data[self.size] = value
+        self.size += 1
+
+    def extend(self, values):
+        """Append array of values."""
+        values = np.asarray(values)
+        self.reserve(self.size + len(values))
+
+        self.data[self.size:self.size + len(values)] = values
+        self.size += len(values)
+
+    def view(self, start=0) -> np.ndarray:
+        """Values from start on, without copying.
+
+        Values already appended never change, so the view stays valid
+        after more values are appended.
+        """
+        return self.data[start:self.size]
+
+
+class CoordinateBuffer(Buffer):
+    """Buffer of one coordinate in the chosen storage.
+
+    Quantized storage maps [low, high] onto the whole range of the integer
+    type, so int16 keeps 2**16 distinct values across limits. Views decode
+    back to float64.
+    """
+
+    def __init__(self, storage='float64', low=-np.inf, high=np.inf,
+                 capacity=INITIAL_CAPACITY):
+        """Create empty buffer.
+
+        Args:
+            storage (str, optional): key of STORAGES. Defaults to 'float64'.
+            low (float, optional): smallest coordinate. Defaults to -inf.
+            high (float, optional): largest coordinate. Defaults to inf.
+            capacity (int, optional): values allocated before the first
+                one. Defaults to INITIAL_CAPACITY.
+
+        Quantized storage needs finite limits, float64 is used otherwise.
+        """
+        dtype, quantized = STORAGES[storage]
+        if quantized and not (np.isfinite(low) and np.isfinite(high)
+                              and high > low):
+            storage = 'float64'
+            dtype, quantized = STORAGES[storage]
+
+        super().__init__(dtype, capacity)
+
+        self.storage = storage
+        self.quantized = quantized
+        self.low = float(low)
+
+        if quantized:
+            info = np.iinfo(dtype)
+            self.offset = float(info.min)
+            self.last = float(info.max)
+            self.scale = (high - low) / (self.last - self.offset)
+
+    def encode(self, values):
+        """Stored representation of coordinates."""
+        if not self.quantized:
+            return values
+
+        stored = (np.asarray(values) - self.low) / self.scale + self.offset
+
+        return np.clip(np.rint(stored), self.offset, self.last)
+
+    def decode(self, stored: np.ndarray) -> np.ndarray:
+        """Coordinates of stored representation."""
+        if not self.quantized:
+            return stored
+
+        return self.low + (stored - self.offset) * self.scale
+
+    def append(self, value):
+        """Append one coordinate."""
+        if self.quantized:
+            value = round((value - self.low) / self.scale + self.offset)
+            # Rounding errors at limits
+            value = min(max(value, self.offset), self.last)
+
+        super().append(value)
+
+    def extend(self, values):
+        """Append array of coordinates."""
+        super().extend(self.encode(values))
+
+    def raw(self, start=0) -> np.ndarray:
+        """Stored representation from start on, without copying."""
+        return super().view(start)
+
+    def view(self, start=0) -> np.ndarray:
+        """Coordinates from start on, copied only if decoded."""
+        return self.decode(self.raw(start))
@@ -0,0 +1,115 @@
+"""On-disk cache of chaos game results keyed by settings of the run."""
+
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+# Change when format of cached results changes
+VERSION = 4
+
+
+class ResultCache:
+    """Directory of compressed `.npz` results, least recently used go first.
+
+    Files are named by hash of run settings, so equal settings give the
+    same file. Hits touch the file, eviction removes the oldest ones until
+    the total size fits.
+    """
+
+    def __init__(self, directory, max_bytes: int):
+        """Open cache.
+
+        Args:
+            directory (str | Path): where results are stored
+            max_bytes (int): size limit of all results
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(settings: dict) -> str:
+        """Hash of run settings.
+
+        Args:
+            settings (dict): JSON serializable settings, e.g. from
+                Worker2D.run_settings
+
+        Returns:
+            str: hex digest
+        """
+        data = json.dumps({'version': VERSION, **settings},
+                          sort_keys=True,
+                          default=str)
+
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def path(self, key: str) -> Path:
+        """File of result."""
+        return self.directory / f'{key}.npz'
+
+    def get(self, key: str) -> dict | None:
+        """Load result.
+
+        Args:
+            key (str): hash of run settings
+
+        Returns:
+            dict | None: arrays by name or None if there is no result
+        """
+        path = self.path(key)
+
+        try:
+            with np.load(path) as data:
+                result = {name: data[name] for name in data.files}
+        except (OSError, ValueError):
+            return None
+
+        # Recently used
+        path.touch()
+
+        return result
+
+    def put(self, key: str, **arrays):
+        """Store result and evict old ones if cache is too big.
+
+        Args:
+            key (str): hash of run settings
+            **arrays: arrays to store
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        # Readers never see partially written file
+        tmp = self.directory / f'{key}.{uuid.uuid4().hex}.tmp.npz'
+        np.savez_compressed(tmp, **arrays)
+        tmp.replace(self.path(key))
+
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used results until size fits."""
+        entries = []
+        for path in self.directory.glob('*.npz'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+
+            if not path.name.endswith('.tmp.npz'):
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+
+            # Another thread may have removed it already
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+            total -= size
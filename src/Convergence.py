@@ -0,0 +1,71 @@
+"""Stopping rule of adaptive runs: picture at target resolution is done."""
+
+from math import ceil
+
+import numpy as np
+
+from Raster import to_pixels
+
+
+class Occupancy:
+    """Pixels of the picture that have at least one point.
+
+    Run has converged when new points hardly ever fall on empty pixels,
+    more points wouldn't change the picture at this resolution.
+    """
+
+    def __init__(self, extent, width: int, threshold=0.01):
+        """Create empty histogram.
+
+        Args:
+            extent (tuple): xmin, xmax, ymin, ymax of the picture
+            width (int): width of the picture in pixels, height follows
+                from extent
+            threshold (float, optional): part of points on new pixels
+                below which run has converged. Defaults to 0.01.
+        """
+        xmin, xmax, ymin, ymax = extent
+
+        self.extent = extent
+        self.width = max(int(width), 1)
+        self.height = max(ceil(self.width * (ymax - ymin) / (xmax - xmin)), 1)
+        self.threshold = threshold
+
+        self.occupied = np.zeros(self.height * self.width, dtype=bool)
+        self.rate = 1.0
+
+    def add(self, x, y) -> float:
+        """Mark pixels of new points.
+
+        Args:
+            x (np.ndarray): x coordinates
+            y (np.ndarray): y coordinates
+
+        Returns:
+            float: part of points that fell on empty pixels, 0 if there
+                are no points: the picture didn't change, e.g. run records
+                a window the game hardly ever visits
+        """
+        if not len(x):
+            self.rate = 0.0
+            return self.rate
+
+        rows, cols, mask = to_pixels(x, y, self.extent,
+                                     self.width, self.height)
+
+        pixels = np.unique(rows[mask] * self.width + cols[mask])
+        new = np.count_nonzero(~self.occupied[pixels])
+        self.occupied[pixels] = True
+
+        self.rate = new / len(x)
+
+        return self.rate
+
+    def converged(self) -> bool:
+        """New pixel rate of the last points is below threshold."""
+        return self.rate < self.threshold
+
+    @property
+    def pixels(self) -> int:
+        """Number of occupied pixels."""
+        return int(np.count_nonzero(self.occupied))
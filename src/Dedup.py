@@ -0,0 +1,185 @@
+"""Streaming deduplication of points on a grid."""
+
+import numpy as np
+
+# Cell indices below this pack into one int64 key
+PACK_LIMIT = 2**31
+MASK = 2**32 - 1
+
+
+class SortedKeys:
+    """Set of keys kept as a few sorted arrays, 8 B per int64 key.
+
+    New keys form a new run, runs are merged when the newer one gets
+    about as large as the previous one, as in a log-structured merge tree:
+    every key is merged a logarithmic number of times and there are a
+    logarithmic number of runs to search.
+    """
+
+    def __init__(self):
+        """Create empty set."""
+        self.runs = []
+
+    def __len__(self) -> int:
+        """Number of keys."""
+        return sum(len(run) for run in self.runs)
+
+    def clear(self):
+        """Remove all keys."""
+        self.runs = []
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        """Mask of keys that are in the set."""
+        found = np.zeros(len(keys), dtype=bool)
+        for run in self.runs:
+            idx = np.minimum(np.searchsorted(run, keys), len(run) - 1)
+            found |= run[idx] == keys
+
+        return found
+
+    def add(self, keys: np.ndarray):
+        """Add sorted distinct keys that aren't in the set yet."""
+        if not len(keys):
+            return
+
+        self.runs.append(keys)
+        while len(self.runs) > 1 and len(self.runs[-2]) <= 2 * len(self.runs[-1]):
+            last = self.runs.pop()
+            prev = self.runs.pop()
+            # Two sorted runs, stable sort merges them in linear time
+            self.runs.append(np.sort(np.concatenate([prev, last]),
+                                     kind='stable'))
+
+    def update(self, keys: np.ndarray):
+        """Add any keys."""
+        keys = distinct(keys)
+        self.add(keys[~self.contains(keys)])
+
+    def map(self, function):
+        """Replace every key with function of it, equal results merge.
+
+        Args:
+            function (Callable): array of keys -> array of new keys
+        """
+        runs, self.runs = self.runs, []
+        for run in runs:
+            self.update(function(run))
+
+    def array(self) -> np.ndarray:
+        """All keys, sorted."""
+        if not self.runs:
+            return np.empty(0, dtype=np.int64)
+        if len(self.runs) == 1:
+            return self.runs[0]
+
+        return np.sort(np.concatenate(self.runs), kind='stable')
+
+
+def distinct(keys: np.ndarray) -> np.ndarray:
+    """Sorted distinct keys, np.unique is much slower on large arrays."""
+    keys = np.sort(keys)
+    if not len(keys):
+        return keys
+
+    first = np.empty(len(keys), dtype=bool)
+    first[0] = True
+    np.not_equal(keys[1:], keys[:-1], out=first[1:])
+
+    return keys[first]
+
+
+def unpack(keys: np.ndarray) -> np.ndarray:
+    """Packed int64 keys as complex keys, see GridDedup.keys."""
+    kx = keys >> 32
+    ky = ((keys & MASK) + 2**31 & MASK) - 2**31
+
+    return kx + 1j * ky
+
+
+class GridDedup:
+    """Keeps points that fall into grid cells not seen before.
+
+    Cells seen so far are a SortedKeys set, so chunks can be filtered as
+    they come, in time that depends on the chunk and only logarithmically
+    on points before. Memory is 8 B per distinct cell, 16 B when cell
+    indices don't fit in 32 bits.
+    """
+
+    def __init__(self, decimals=9, cell=None):
+        """Create empty grid.
+
+        Args:
+            decimals (int, optional): cell side is 10**-decimals.
+                Defaults to 9.
+            cell (float, optional): cell side, e.g. size of a pixel,
+                overrides decimals. Defaults to None.
+        """
+        self.cell = cell or 10.0**-decimals
+        self.cells = SortedKeys()
+        # Keys are packed int64 until a chunk doesn't fit, complex after
+        self.packed = True
+
+    def __len__(self) -> int:
+        """Number of distinct cells seen."""
+        return len(self.cells)
+
+    def clear(self):
+        """Forget seen cells."""
+        self.cells.clear()
+        self.packed = True
+
+    def keys(self, x, y) -> np.ndarray:
+        """Keys of cells of points.
+
+        Args:
+            x (np.ndarray): x coordinates
+            y (np.ndarray): y coordinates
+
+        Returns:
+            np.ndarray: packed int64 keys if cell indices of all points
+                seen so far fit in 32 bits, complex kx + 1j * ky otherwise
+        """
+        kx = np.floor(np.asarray(x, dtype=float) / self.cell)
+        ky = np.floor(np.asarray(y, dtype=float) / self.cell)
+
+        fits = not len(kx) or max(np.abs(kx).max(), np.abs(ky).max()) < PACK_LIMIT
+        if self.packed and not fits:
+            self.cells.map(unpack)
+            self.packed = False
+
+        if not self.packed:
+            return kx + 1j * ky
+
+        kx = kx.astype(np.int64)
+        ky = ky.astype(np.int64)
+
+        return (kx << 32) | (ky & MASK)
+
+    def filter(self, x, y) -> np.ndarray:
+        """Mark the first point of every cell not seen before.
+
+        Args:
+            x (np.ndarray): x coordinates
+            y (np.ndarray): y coordinates
+
+        Returns:
+            np.ndarray: boolean mask of points to keep
+        """
+        keys = self.keys(x, y)
+        mask = np.zeros(len(keys), dtype=bool)
+        if not len(keys):
+            return mask
+
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        starts = np.empty(len(keys), dtype=bool)
+        starts[0] = True
+        np.not_equal(keys[1:], keys[:-1], out=starts[1:])
+
+        values = keys[starts]
+        new = ~self.cells.contains(values)
+        self.cells.add(values[new])
+
+        mask[order[starts][new]] = True
+
+        return mask
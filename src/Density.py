@@ -0,0 +1,246 @@
+"""Density image display of many points on 2d canvas."""
+
+import numpy as np
+import pyqtgraph as pg
+from pyqtgraph.Qt.QtCore import QObject, QRectF, QTimer, pyqtSignal
+
+from Raster import color_index, density, palette_index, shade
+
+
+class DensityLayer:
+    """Shows points as per color density image of the visible range.
+
+    Image has the resolution of the view and is recomputed when the range
+    changes, so pan and zoom cost doesn't depend on scatter items.
+    """
+
+    def __init__(self, plot_item, x, y, colors):
+        """Attach to plot.
+
+        Args:
+            plot_item (pg.PlotItem): plot to show on
+            x (np.ndarray): x coordinates
+            y (np.ndarray): y coordinates
+            colors (np.ndarray): color of every point
+        """
+        self.plot_item = plot_item
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        self.colors = np.asarray(colors)
+
+        self.palette, self.index = color_index(colors)
+        self.palette_rgba = np.array([pg.mkColor(c).getRgb()
+                                      for c in self.palette])
+
+        self.item = pg.ImageItem(axisOrder='row-major')
+        # Under absolute and borders
+        self.item.setZValue(-1)
+        self.plot_item.addItem(self.item)
+
+        # Many range changes while dragging give one render
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(15)
+        self.timer.timeout.connect(self.render)
+
+        self.view_box = plot_item.getViewBox()
+        self.view_box.sigRangeChanged.connect(self.timer.start)
+
+        self.render()
+
+    def __len__(self) -> int:
+        """Number of shown points."""
+        return len(self.x)
+
+    def add_points(self, x, y, colors):
+        """Add points to shown ones.
+
+        Args:
+            x (np.ndarray): x coordinates
+            y (np.ndarray): y coordinates
+            colors (np.ndarray): color of every point
+        """
+        self.x = np.concatenate([self.x, x])
+        self.y = np.concatenate([self.y, y])
+        self.colors = np.concatenate([self.colors, colors])
+
+        if np.isin(colors, self.palette).all():
+            index = palette_index(colors, self.palette)
+            self.index = np.concatenate([self.index, index])
+        else:
+            self.palette, self.index = color_index(self.colors)
+            self.palette_rgba = np.array([pg.mkColor(c).getRgb()
+                                          for c in self.palette])
+
+        self.timer.start()
+
+    def set_colors(self, colors):
+        """Change colors of points.
+
+        Args:
+            colors (np.ndarray): color of every point
+        """
+        self.colors = np.asarray(colors)
+        self.palette, self.index = color_index(colors)
+        self.palette_rgba = np.array([pg.mkColor(c).getRgb()
+                                      for c in self.palette])
+
+        self.render()
+
+    def render(self):
+        """Recompute image for current view range."""
+        (xmin, xmax), (ymin, ymax) = self.view_box.viewRange()
+        width = max(int(self.view_box.width()), 1)
+        height = max(int(self.view_box.height()), 1)
+
+        counts = density(self.x, self.y, self.index, len(self.palette),
+                         (xmin, xmax, ymin, ymax), width, height)
+        image = shade(counts, self.palette_rgba)
+
+        # Row-major image goes bottom up in view
+        self.item.setImage(image[::-1], autoLevels=False)
+        self.item.setRect(QRectF(xmin, ymin, xmax - xmin, ymax - ymin))
+
+    def detach(self):
+        """Remove image from plot and stop following view."""
+        self.timer.stop()
+        self.view_box.sigRangeChanged.disconnect(self.timer.start)
+
+        self.plot_item.removeItem(self.item)
+
+
+class DensitySignals(QObject):
+    """Defines the signals available from a running density job.
+
+    Supported signals are:
+
+    result
+        (colors, height, width) counts and extent they were counted for
+
+    """
+
+    result = pyqtSignal(object, object)
+
+
+class StoreDensityJob:
+    """Scheduler job that counts stored points in pixels of a view."""
+
+    def __init__(self, store, extent, width: int, height: int, colors: int):
+        """Remember view.
+
+        Args:
+            store (PointStore): points with vertex indices
+            extent (tuple): xmin, xmax, ymin, ymax of the view
+            width (int): image width in pixels
+            height (int): image height in pixels
+            colors (int): number of colors, vertex index is color index
+        """
+        self.store = store
+        self.extent = extent
+        self.width = width
+        self.height = height
+        self.colors = colors
+
+        self.cancelled = False
+        self.signals = DensitySignals()
+
+    def cancel(self):
+        """Stop after the current chunk, nothing is emitted."""
+        self.cancelled = True
+
+    def run(self):
+        """Run in Scheduler."""
+        counts = np.zeros((self.colors, self.height, self.width),
+                          dtype=np.uint32)
+
+        for x, y, index in self.store.chunks('x', 'y', 'indices'):
+            if self.cancelled:
+                return
+
+            counts += density(x, y, index, self.colors, self.extent,
+                              self.width, self.height)
+
+        self.signals.result.emit(counts, self.extent)
+
+
+class StoredDensityLayer(DensityLayer):
+    """Density image of points on disk.
+
+    Store is read by a Scheduler job for every view, the image of the
+    previous view stays until counts of the new one are ready.
+    """
+
+    def __init__(self, plot_item, store, palette, submit):
+        """Attach to plot.
+
+        Args:
+            plot_item (pg.PlotItem): plot to show on
+            store (PointStore): points with vertex indices
+            palette (list[str]): color of every vertex
+            submit (Callable): submits job to scheduler, a new job must
+                supersede the previous one
+        """
+        super().__init__(plot_item, np.empty(0), np.empty(0), palette)
+        self.store = store
+        self.submit = submit
+        self.job = None
+        self.counts = None
+
+        # Vertex index is the color index
+        self.palette = np.asarray(palette)
+        self.palette_rgba = np.array([pg.mkColor(c).getRgb()
+                                      for c in self.palette])
+
+        self.render()
+
+    def __len__(self) -> int:
+        """Number of shown points."""
+        return len(self.store)
+
+    def set_colors(self, palette):
+        """Change colors of vertices, counts are reused.
+
+        Args:
+            palette (list[str]): color of every vertex
+        """
+        self.palette = np.asarray(palette)
+        self.palette_rgba = np.array([pg.mkColor(c).getRgb()
+                                      for c in self.palette])
+
+        if self.counts is not None:
+            self.show(self.job, *self.counts)
+
+    def render(self):
+        """Count points of current view range in background."""
+        # Base class renders before store is set
+        if not hasattr(self, 'store'):
+            return
+
+        (xmin, xmax), (ymin, ymax) = self.view_box.viewRange()
+        width = max(int(self.view_box.width()), 1)
+        height = max(int(self.view_box.height()), 1)
+
+        job = StoreDensityJob(self.store, (xmin, xmax, ymin, ymax),
+                              width, height, len(self.palette))
+        job.signals.result.connect(
+            lambda counts, extent: self.show(job, counts, extent))
+        self.job = job
+
+        self.submit(job)
+
+    def show(self, job, counts, extent):
+        """Show counts of job if it is the latest one."""
+        if job is not self.job:
+            return
+
+        self.counts = counts, extent
+        xmin, xmax, ymin, ymax = extent
+        image = shade(counts, self.palette_rgba)
+
+        self.item.setImage(image[::-1], autoLevels=False)
+        self.item.setRect(QRectF(xmin, ymin, xmax - xmin, ymax - ymin))
+
+    def detach(self):
+        """Remove image from plot, counting in progress is dropped."""
+        self.job = None
+        super().detach()
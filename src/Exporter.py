@@ -7,9 +7,16 @@ from pathlib import Path
 
 import matplotlib.pyplot as plt
 import numpy as np
-from pyqtgraph.Qt.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+from matplotlib.colors import to_rgba_array
+from pyqtgraph.Qt.QtCore import QObject, pyqtSignal
 
 from Constants import FRAME_FIRST_TYPE, FRAME_SECOND_TYPE
+from Raster import color_index, rasterize, render, to_pixels
+from Store import Partition
+from Tiles import MosaicWriter, TiffWriter, TiledPoints, TileGrid
+
+# Points are embedded as one prerendered image, everything else is vector
+RASTER_LAYER_SUFFIXES = ('.pdf', '.svg')
 
 
 def safe_filename(name: str) -> str:
@@ -41,7 +48,7 @@ class ExporterSignals(QObject):
     finished = pyqtSignal()
 
 
-class Exporter2D(QRunnable):
+class Exporter2D:
     """Class managing matplotlib export."""
 
     def __init__(
@@ -53,10 +60,13 @@ class Exporter2D(QRunnable):
             y,
             colors,
             lamb,
+            store=None,
         ):
-        """Parse params for future exporting."""
-        super().__init__()
-        self.threadpool = QThreadPool()
+        """Parse params for future exporting.
+
+        With store, x, y and colors are ignored: tiled export reads points
+        from disk band by band, other exports load them.
+        """
         self.args = ()
         self.kwargs = {}
         self.signals = ExporterSignals()
@@ -68,6 +78,7 @@ class Exporter2D(QRunnable):
         self.y = y
         self.colors = colors
         self.lamb = lamb
+        self.store = store
 
         self.line_width = 0.25
         self.border_width = 0.25
@@ -77,15 +88,32 @@ class Exporter2D(QRunnable):
         self.do_plot_axis = 'on'
         self.has_colors = False
         self.rasterized = True
+        self.tiled_width = 0
+        self.tile_size = 4096
+        self.cancelled = False
 
         self.__parse_params()
         self.__parse_file_name()
 
 
-    @pyqtSlot()
+    def output_path(self) -> Path:
+        """File the export is written to."""
+        return Path(self.directory) / safe_filename(self.file_name)
+
+    def cancel(self):
+        """Ask running export to stop, output is left incomplete."""
+        self.cancelled = True
+
     def run(self):
-        """QThread magic."""
-        self.export_2d(*self.args, **self.kwargs)
+        """Run export in Scheduler."""
+        if self.tiled_width > 0:
+            self.export_tiled(*self.args, **self.kwargs)
+        else:
+            if self.store is not None:
+                self.x, self.y, indices = self.store.load('x', 'y', 'indices')
+                self.colors = np.asarray(self.worker.vertices_colors)[indices]
+
+            self.export_2d(*self.args, **self.kwargs)
 
         self.signals.finished.emit()
 
@@ -110,6 +138,10 @@ class Exporter2D(QRunnable):
         self.do_plot_axis = yes_or_no[value]
         self.rasterized = self.params_exp.child('Растеризовать').value()
 
+        self.tiled_width = self.params_exp.child('Ширина изображения (тайлы)').value()
+        if val := self.params_exp.child('Размер тайла').value():
+            self.tile_size = val
+
 
     def __parse_file_name(self):
         file_name = self.params_exp.child('Имя файла').value()
@@ -141,11 +173,54 @@ class Exporter2D(QRunnable):
             file_name = file_name.replace('__', '_')
 
         self.file_name = file_name
+        self.raster_layer = self.rasterized\
+            and Path(file_name).suffix.lower() in RASTER_LAYER_SUFFIXES
 
 
-    def export_2d(self):
-        """Export image file with matplotlib."""
-        plt.gca().set_aspect('equal', adjustable='box')
+    def __plot_raster_layer(self):
+        """Draw points as a single image with resolution of the output file."""
+        if not len(self.x):
+            return
+
+        ax = plt.gca()
+        fig = plt.gcf()
+
+        # Absolute and borders are already on axes, add points to limits
+        # and freeze them: image is built for these exact limits
+        ax.update_datalim([(np.min(self.x), np.min(self.y)),
+                           (np.max(self.x), np.max(self.y))])
+        ax.autoscale_view()
+        extent = (*ax.get_xlim(), *ax.get_ylim())
+        ax.set_xlim(extent[:2])
+        ax.set_ylim(extent[2:])
+        ax.apply_aspect()
+
+        box = ax.get_position()
+        width = max(round(box.width * fig.get_figwidth() * self.dpi), 1)
+        height = max(round(box.height * fig.get_figheight() * self.dpi), 1)
+
+        # s in scatter is area in points^2, 1 point = 1/72 inch
+        radius = np.sqrt(self.point_size) / 2 * self.dpi / 72
+
+        palette, index = color_index(self.colors)
+        palette_rgba = np.round(to_rgba_array(palette) * 255)
+
+        image = rasterize(self.x, self.y, index, palette_rgba,
+                          extent, width, height, radius=radius)
+
+        plt.imshow(image,
+                   extent=extent,
+                   interpolation='nearest',
+                   zorder=1)
+
+
+    def overlay_lines(self) -> list:
+        """Absolute and borders as polylines in plane coordinates.
+
+        Returns:
+            list: tuples (x_coords, y_coords, color, line width in points)
+        """
+        lines = []
 
         if self.params.child('Рисовать абсолют').value():
             color = 'red'
@@ -156,11 +231,10 @@ class Exporter2D(QRunnable):
                 self.line_width = val
 
             if self.worker.frame_type == FRAME_FIRST_TYPE:
-                par = {'color': color, 'linewidth': self.line_width}
                 theta = np.linspace(0, 2 * np.pi, 2**14)
                 x_coords = np.cos(theta)
                 y_coords = np.sin(theta)
-                plt.plot(x_coords, y_coords, **par)
+                lines.append((x_coords, y_coords, color, self.line_width))
 
             if self.worker.frame_type == FRAME_SECOND_TYPE:
                 # Абсолют — гипербола yx - 1 = 0
@@ -174,13 +248,13 @@ class Exporter2D(QRunnable):
                 else:
                     # xmin * xmax < 0, значит, ноль содержится
                     x_coords = np.linspace(0.01, right, cnt)
-                    y_coords = [1 / x for x in x_coords]
-                    plt.plot(x_coords, y_coords, c=color, linewidth=self.line_width)
+                    y_coords = 1 / x_coords
+                    lines.append((x_coords, y_coords, color, self.line_width))
 
                     x_coords = np.linspace(left, -0.01, cnt)
 
-                y_coords = [1 / x for x in x_coords]
-                plt.plot(x_coords, y_coords, c=color, linewidth=self.line_width)
+                y_coords = 1 / x_coords
+                lines.append((x_coords, y_coords, color, self.line_width))
 
         if self.params.child('Рисовать границы').value():
             if value := self.params_exp.child('Ширина границ').value():
@@ -190,21 +264,138 @@ class Exporter2D(QRunnable):
             for_pairing = [i.to_lower_dimension() for i in vertices]
 
             for cur, nex in itertools.pairwise(for_pairing):
-                plt.plot([cur[1], nex[1]],
-                         [cur[2], nex[2]],
-                         c='black',
-                         linewidth=self.border_width)
+                lines.append(([cur[1], nex[1]],
+                              [cur[2], nex[2]],
+                              'black',
+                              self.border_width))
+
+        return lines
+
+
+    def raster_lines(self, dpi=None) -> list:
+        """Overlay lines for Raster, widths are scaled by dpi.
+
+        Args:
+            dpi (float, optional): pixels per inch, 72 keeps widths in
+                pixels. Defaults to None, i.e. export dpi.
+
+        Returns:
+            list: tuples (x_coords, y_coords, rgba, line width in pixels)
+        """
+        dpi = dpi or self.dpi
+
+        return [(np.asarray(xs, dtype=float),
+                 np.asarray(ys, dtype=float),
+                 np.round(to_rgba_array(color)[0] * 255),
+                 line_width * dpi / 72)
+                for xs, ys, color, line_width in self.overlay_lines()]
+
+
+    def export_tiled(self):
+        """Export poster size image tile by tile without matplotlib.
+
+        Points are partitioned by tiles once, then every tile is rasterized
+        together with absolute and borders and streamed to the writer, so
+        only one tile is in memory. `.tif`/`.tiff` gives tiled TIFF, other
+        extensions give PNG mosaic with JSON manifest.
+        """
+        if not self.file_name:
+            return
+
+        xmin, xmax = self.worker.xmin, self.worker.xmax
+        ymin, ymax = self.worker.ymin, self.worker.ymax
+        if not np.isfinite([xmin, xmax, ymin, ymax]).all():
+            xmin, xmax, ymin, ymax = self.worker.guess_limits()
+        extent = (xmin, xmax, ymin, ymax)
+
+        width = self.tiled_width
+        height = max(round(width * (ymax - ymin) / (xmax - xmin)), 1)
+
+        # Same physical sizes as in the regular export with given dpi
+        radius = np.sqrt(self.point_size) / 2 * self.dpi / 72
+        lines = self.raster_lines()
+
+        if self.store is None:
+            palette, index = color_index(self.colors)
+        else:
+            # Vertex index is the color index
+            palette, index = self.worker.vertices_colors, None
+        palette_rgba = np.round(to_rgba_array(palette) * 255)
+
+        path = self.output_path()
+
+        if path.suffix.lower() in ('.tif', '.tiff'):
+            # TIFF tiles must be multiple of 16
+            tile = max(self.tile_size // 16 * 16, 16)
+            grid = TileGrid(extent, width, height, tile)
+            writer = TiffWriter(path, width, height, tile)
+        else:
+            grid = TileGrid(extent, width, height, self.tile_size)
+            writer = MosaicWriter(path.with_suffix('.png'), grid)
+
+        margin = ceil(radius / grid.tile)
+        if self.store is None:
+            points = TiledPoints(grid, self.x, self.y, index)
+        else:
+            bands = self.partition_rows(grid)
+
+        for row, col in grid:
+            if self.cancelled:
+                break
+
+            if self.store is not None and col == 0:
+                points = TiledPoints(grid, *bands.get(
+                    *range(row - margin, row + margin + 1)))
+
+            x, y, cur_index = points.get(row, col, margin=margin)
+            image = render(x, y, cur_index, palette_rgba,
+                           grid.tile_extent(row, col), grid.tile, grid.tile,
+                           radius=radius, lines=lines)
+
+            tile_height, tile_width = grid.shape(row, col)
+            writer.write_tile(row, col, image[:tile_height, :tile_width])
+
+        writer.close()
+
+        if self.store is not None:
+            bands.close()
+
+    def partition_rows(self, grid: TileGrid) -> Partition:
+        """Stored points split by row of tiles, points off image dropped.
+
+        Store is read once, then only rows of a band are in memory.
+        Bucket files are next to the store, which has room for them.
+        """
+        def bucket_of(x, y, _):
+            rows, _, mask = to_pixels(x, y, grid.extent,
+                                      grid.width, grid.height)
+            return np.where(mask, rows // grid.tile, -1)
+
+        return Partition(self.store, bucket_of, grid.rows,
+                         names=('x', 'y', 'indices'),
+                         directory=self.store.directory)
+
+
+    def export_2d(self):
+        """Export image file with matplotlib."""
+        plt.gca().set_aspect('equal', adjustable='box')
+
+        for x_coords, y_coords, color, line_width in self.overlay_lines():
+            plt.plot(x_coords, y_coords, c=color, linewidth=line_width)
 
         if not self.file_name:
             return
 
         plt.axis(self.do_plot_axis)
-        plt.scatter(self.x,
-                    self.y,
-                    c=self.colors,
-                    s=self.point_size,
-                    edgecolors='none',
-                    rasterized=self.rasterized)
+        if self.raster_layer:
+            self.__plot_raster_layer()
+        else:
+            plt.scatter(self.x,
+                        self.y,
+                        c=self.colors,
+                        s=self.point_size,
+                        edgecolors='none',
+                        rasterized=self.rasterized)
 
         plt.savefig(f'{self.directory}/{safe_filename(self.file_name)}', dpi=self.dpi)
 
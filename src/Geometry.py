@@ -47,3 +47,90 @@ class Line:
         det_y = det([[self.a, -self.c], [another.a, -another.c]])
 
         return Point2(det_x / system_det, det_y / system_det)
+
+
+class EdgeIndex:
+    """Bounding volume hierarchy over edges of closed polygon.
+
+    Consecutive edges are near each other, so nodes are halves of the
+    range of edges, and only boxes that the line passes through are
+    visited: O(log n) for a convex polygon instead of every edge.
+    """
+
+    # Edges in a leaf, checked one by one
+    LEAF_SIZE = 4
+
+    def __init__(self, vertices: list[Point2]):
+        """Build hierarchy.
+
+        Args:
+            vertices (list[Point2]): vertices of polygon in order,
+                without the first one repeated
+        """
+        points = [(float(v[1]), float(v[2])) for v in vertices]
+        self.edges = list(zip(points, points[1:] + points[:1], strict=True))
+
+        # xmin, xmax, ymin, ymax, first edge, last edge, left, right
+        self.nodes = []
+        if self.edges:
+            self.__build(0, len(self.edges))
+
+    def __build(self, lo: int, hi: int) -> int:
+        idx = len(self.nodes)
+
+        xs = [p[0] for edge in self.edges[lo:hi] for p in edge]
+        ys = [p[1] for edge in self.edges[lo:hi] for p in edge]
+        self.nodes.append([min(xs), max(xs), min(ys), max(ys), lo, hi, -1, -1])
+
+        if hi - lo > self.LEAF_SIZE:
+            mid = (lo + hi) // 2
+            self.nodes[idx][6] = self.__build(lo, mid)
+            self.nodes[idx][7] = self.__build(mid, hi)
+
+        return idx
+
+    def crossings(self, p: Point2, q: Point2) -> list[Point2]:
+        """Points where line through p and q crosses edges.
+
+        Crossings at vertices are skipped.
+
+        Args:
+            p (Point2): first point of line
+            q (Point2): second point of line
+
+        Returns:
+            list[Point2]: crossings, in order of edges
+        """
+        if not self.nodes:
+            return []
+
+        line = Line(p, q)
+        a, b, c = float(line.a), float(line.b), float(line.c)
+
+        result = []
+        stack = [0]
+        while stack:
+            xmin, xmax, ymin, ymax, lo, hi, left, right = self.nodes[stack.pop()]
+
+            # Box is on one side of the line
+            corners = (a * xmin + b * ymin + c, a * xmin + b * ymax + c,
+                       a * xmax + b * ymin + c, a * xmax + b * ymax + c)
+            if min(corners) > 0 or max(corners) < 0:
+                continue
+
+            if left >= 0:
+                stack += (right, left)
+                continue
+
+            for (x1, y1), (x2, y2) in self.edges[lo:hi]:
+                s1 = a * x1 + b * y1 + c
+                s2 = a * x2 + b * y2 + c
+                if s1 * s2 > 0 or s1 == s2:
+                    continue
+
+                t = s1 / (s1 - s2)
+                point = Point2(x1 + t * (x2 - x1), y1 + t * (y2 - y1))
+                if point != Point2(x1, y1) and point != Point2(x2, y2):
+                    result.append(point)
+
+        return result
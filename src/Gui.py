@@ -7,18 +7,21 @@
 
 import itertools
 import json
+import logging
 import sys
+import time
 from math import ceil, inf, pi
 from pathlib import Path
 
 import numpy as np
 import pyqtgraph as pg
-import pyqtgraph.opengl as gl
 from pyqtgraph.parametertree import Parameter, ParameterTree
-from pyqtgraph.Qt.QtGui import QAction
+from pyqtgraph.Qt.QtCore import QTimer
+from pyqtgraph.Qt.QtGui import QAction, QFontDatabase
 from pyqtgraph.Qt.QtWidgets import (
     QFileDialog,
     QHBoxLayout,
+    QLabel,
     QMainWindow,
     QPushButton,
     QSplitter,
@@ -29,10 +32,45 @@ from pyqtgraph.Qt.QtWidgets import (
 from seval import safe_eval
 
 from Constants import FRAME_FIRST_TYPE, FRAME_SECOND_TYPE
-from Exporter import Exporter2D
+from Convergence import Occupancy
+from Density import DensityLayer, StoredDensityLayer
 from Iterate2D import Worker2D
-from Iterate3D import Worker3D
 from Point import Point, Point3
+from Profiler import ProfiledJob, profiling_enabled
+from Region import Region, load_region
+from Scheduler import BACKGROUND, INTERACTIVE, REFINE, Scheduler
+
+logger = logging.getLogger('pyv')
+
+# Parameters that change only the look of computed points, the rest
+# change the points
+PRESENTATION_PARAMS = frozenset({
+    'Цвета точек',
+    'Случайные цвета',
+    'Размер точки',
+    'Рисовать границы',
+    'Ширина границ',
+    'Рисовать абсолют',
+    'Цвет абсолюта',
+    'Порог плотностного режима',
+    'Уточнять при масштабировании',
+    'Задержка уточнения (мс)',
+    'Уровни пирамиды',
+    'Директория пирамиды',
+    'Директория кэша',
+    'Размер кэша (МБ)',
+    'Профилирование',
+    'Фрактальная размерность',
+})
+
+# Width of matplotlib figure, inches
+EXPORT_FIGURE_WIDTH = 6.4
+
+# Iterations of runs that end by time budget
+UNBOUNDED_ITERATIONS = sys.maxsize
+
+# Iterations of adaptive runs at most, in case picture never settles
+ADAPTIVE_ITERATIONS = 10**10
 
 
 def parse_m(data: str) -> Point3:
@@ -129,6 +167,8 @@ class Application:
 
     def __init__(self):
         self.init_app()
+        self.scheduler = Scheduler()
+        self.app.aboutToQuit.connect(self.scheduler.cancel_all)
         self.init_main_window()
         self.init_params()
         self.init_canvas()
@@ -140,7 +180,25 @@ class Application:
         self.main_window.showMaximized()
 
         self.worker = Worker2D()
-        self.worker_3d = Worker3D()
+        # Created on the first 3d plot, scipy is imported only then
+        self.worker_3d = None
+        self.analysis_job = None
+        # Lines of analysis panel by topic
+        self.analysis_lines = {}
+
+        self.density_layer = None
+        self.pyramid_layer = None
+
+        # Points on the 2d canvas: x, y, vertex indices
+        self.points = None
+        # PointStore shown instead of points after run written to disk
+        self.stored = None
+        # Compute settings of shown points, see compute_settings
+        self.plotted_settings = None
+        # Export sweeps started, every sweep runs under its own key
+        self.export_sweeps = 0
+        self.params.sigTreeStateChanged.connect(self.params_changed)
+        self.init_refinement()
 
     def init_app(self):
         pg.setConfigOptions(antialias=True)
@@ -192,20 +250,47 @@ class Application:
         self.canvas_2d = self.graphics_widget_2d.getPlotItem()
         self.canvas_2d.setAspectLocked(is_aspect_locked, aspect)
 
-        # 3d
+        # points
+        self.scatter_2d = pg.ScatterPlotItem()
+        self.canvas_2d.addItem(self.scatter_2d)
+
+        # 3d canvas is built on the first visit of the 3d tab,
+        # OpenGL part of pyqtgraph is slow to import
+        self.tab_3d = QWidget()
+        self.tab_3d.setLayout(QVBoxLayout())
+        self.tab_3d.layout().setContentsMargins(0, 0, 0, 0)
+        self.graphics_widget_3d = None
+
+    def init_canvas_3d(self):
+        """Build 3d canvas if it doesn't exist yet."""
+        if self.graphics_widget_3d is not None:
+            return
+
+        import pyqtgraph.opengl as gl
+
+        background_color = 'w'
+
         # self.graphics_widget_3d =\
         #   gl.GLViewWidget(rotationMethod='quaternion')
         self.graphics_widget_3d = gl.GLViewWidget()
         self.graphics_widget_3d.setBackgroundColor(background_color)
 
-        # points
-        self.scatter_2d = pg.ScatterPlotItem()
         self.scatter_3d = gl.GLScatterPlotItem()
         self.scatter_3d.setGLOptions('translucent')
-
-        self.canvas_2d.addItem(self.scatter_2d)
         self.graphics_widget_3d.addItem(self.scatter_3d)
 
+        self.tab_3d.layout().addWidget(self.graphics_widget_3d)
+
+    def init_refinement(self):
+        """Refine zoomed 2d view in background once it stops changing."""
+        self.refine_worker = None
+
+        self.refine_timer = QTimer()
+        self.refine_timer.setSingleShot(True)
+        self.refine_timer.timeout.connect(self.refine_view)
+
+        self.canvas_2d.getViewBox().sigRangeChanged.connect(self.view_changed)
+
     def init_menu(self):
         action_export = QAction(self.main_window)
         action_export.setObjectName('actionExport')
@@ -217,11 +302,25 @@ class Application:
         action_import.setText('Импортировать')
         action_import.triggered.connect(self.import_conf)
 
+        action_build_pyramid = QAction(self.main_window)
+        action_build_pyramid.setObjectName('actionBuildPyramid')
+        action_build_pyramid.setText('Построить')
+        action_build_pyramid.triggered.connect(self.build_pyramid)
+
+        action_show_pyramid = QAction(self.main_window)
+        action_show_pyramid.setObjectName('actionShowPyramid')
+        action_show_pyramid.setText('Открыть')
+        action_show_pyramid.triggered.connect(self.show_pyramid)
+
         menu = self.main_window.menuBar()
         conf = menu.addMenu('Конфигурация')
         conf.addAction(action_export)
         conf.addAction(action_import)
 
+        pyramid = menu.addMenu('Пирамида тайлов')
+        pyramid.addAction(action_build_pyramid)
+        pyramid.addAction(action_show_pyramid)
+
     def init_buttons_and_layout(self):
         self.btn_plot = QPushButton('Plot')
         self.btn_plot.setShortcut('Ctrl+Return')
@@ -235,8 +334,20 @@ class Application:
         button_layout.addWidget(self.btn_plot)
         button_layout.addWidget(self.btn_export)
 
+        # Counters of the running or last run
+        self.stats_label = QLabel()
+        self.stats_label.setFont(
+            QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont),
+        )
+
+        # Result of analysis of the last run
+        self.analysis_label = QLabel()
+        self.analysis_label.setFont(self.stats_label.font())
+
         main_layout = QVBoxLayout()
         main_layout.addWidget(self.param_tree)
+        main_layout.addWidget(self.stats_label)
+        main_layout.addWidget(self.analysis_label)
         main_layout.addLayout(button_layout)
 
         self.params_and_buttons_widget = QWidget()
@@ -246,7 +357,7 @@ class Application:
         # 2d, 3d tab on the bottom
         tab_widget = QTabWidget()
         tab_widget.addTab(self.graphics_widget_2d, '2d')
-        tab_widget.addTab(self.graphics_widget_3d, '3d')
+        tab_widget.addTab(self.tab_3d, '3d')
         tab_widget.setTabPosition(QTabWidget.TabPosition.South)
         tab_widget.currentChanged.connect(
             lambda: self.tab_changed(
@@ -262,62 +373,267 @@ class Application:
 
         self.main_window.setCentralWidget(splitter)
 
-    def read_config(self):
-        """Read GUI settings and write them to variables."""
-        self.worker.vertices = parse_vertices(
-            self.params.child('Вершины').value(),
-        )
+    def configure_worker(self, worker, settings=None):
+        """Read GUI settings that affect the chaos game into worker.
 
-        xmin, xmax, ymin, ymax = parse_limits(
-            self.params.child('Пределы').value(),
-        )
-        if not self.params.child('Пределы').value():
-            xmin, xmax, ymin, ymax = self.worker.guess_limits()
+        Args:
+            worker (Worker2D): worker to configure
+            settings (dict, optional): values of parameters by name, e.g.
+                of the run a pyramid was built from, see compute_settings.
+                Defaults to None, i.e. current values.
+        """
+        def value(name):
+            if settings is not None and name in settings:
+                return settings[name]
+
+            return self.params.child(name).value()
+
+        worker.seed = None
+        if val := value('Зерно'):
+            worker.seed = int(val)
+        # Random start point and colors are reproducible too
+        worker.random.seed(worker.seed)
+
+        worker.vertices = parse_vertices(value('Вершины'))
 
-            include_absolute = self.params.child(
-                'Угадывать пределы (включить абсолют)',
-            ).value()
+        xmin, xmax, ymin, ymax = parse_limits(value('Пределы'))
+        if not value('Пределы'):
+            xmin, xmax, ymin, ymax = worker.guess_limits()
+
+            include_absolute = value('Угадывать пределы (включить абсолют)')
             if include_absolute:
                 xmin, xmax, ymin, ymax =\
-                    self.worker.guess_limits(contains_absolute=True)
+                    worker.guess_limits(contains_absolute=True)
 
-        self.worker.xmin, self.worker.xmax = xmin, xmax
-        self.worker.ymin, self.worker.ymax = ymin, ymax
+        worker.xmin, worker.xmax = xmin, xmax
+        worker.ymin, worker.ymax = ymin, ymax
 
-        self.canvas_2d.setXRange(xmin, xmax)
-        self.canvas_2d.setYRange(ymin, ymax)
+        worker.prepare_shapely_checker()
 
-        self.worker.prepare_shapely_checker()
+        worker.start_point = parse_m(value('Стартовая точка'))
+        if not value('Стартовая точка'):
+            worker.start_point = worker.gen_start_point()
 
-        self.worker.start_point =\
-            parse_m(self.params.child('Стартовая точка').value())
-        if not self.params.child('Стартовая точка').value():
-            self.worker.start_point = self.worker.gen_start_point()
+        worker.prepare_polygon_checker()
 
-        self.worker.prepare_polygon_checker()
+        worker.coloring = False
+        self.configure_colors(worker)
+
+        worker.inside = value('Рисовать точки внутри')
+        # worker.double_mid =\
+        #     self.params.child('Рисовать вторую середину').value()
 
-        self.worker.coloring = False
+        if val := value('Стратегия'):
+            strategy_path = Path(val)
+            # Добавляем родительскую директорию в sys.path
+            sys.path.append(str(strategy_path.parent))
+            worker.strategy_source = strategy_path.read_text(encoding='utf-8')
+            # Own namespace with choice of the worker, so other runs of
+            # the strategy don't share its randomness
+            namespace = {'__name__': strategy_path.stem}
+            code = compile(worker.strategy_source, str(strategy_path), 'exec')
+            exec(code, namespace)  # noqa: S102
+            namespace['choice'] = worker.random.choice
+            worker.strategy = namespace['strategy']
+
+        worker.transitions = None
+        if worker.strategy_source:
+            from Markov import compile_strategy
+
+            worker.transitions = compile_strategy(worker.strategy_source,
+                                                  len(worker.vertices))
+
+        if val := value('Тип репера'):
+            worker.frame_type = val
+
+        d = {'shapely & polygon': worker.checker,
+             'shapely': worker.shapely_default_checker,
+             'polygon': worker.polygon_default_checker}
+
+        worker.algorithm = value('Алгоритм')
+        worker.checker = d[worker.algorithm]
+
+        shapely_region = Region(worker.shapely_mask,
+                                worker.shapely_default_checker)
+        polygon_region = Region(worker.polygon_mask,
+                                worker.polygon_default_checker)
+        regions = {
+            'shapely & polygon': shapely_region & polygon_region,
+            'shapely': shapely_region,
+            'polygon': polygon_region,
+        }
+        worker.region = regions[worker.algorithm]
+        worker.region_source = ''
+
+        if val := value('Область'):
+            custom = load_region(val)
+            operation = value('Объединение с областью')
+
+            if operation == 'И':
+                worker.region = worker.region & custom
+            else:
+                worker.region = worker.region | custom
+
+            worker.region_source =\
+                f'{operation}\n{Path(val).read_text(encoding="utf-8")}'
+            worker.checker = worker.region.contains
+
+        engines = {'Случайная игра': 'random',
+                   'Детерминированный обход': 'frontier'}
+        worker.engine = engines[value('Движок')]
+        worker.frontier_size = value('Размер фронта')
+        worker.frontier_resolution = value('Разрешение обхода')
+
+        worker.dedup_cell = value('Размер ячейки очистки') or None
+        worker.max_rejections = value('Перезапуск после отказов')
+        worker.storage = value('Хранение координат')
+
+    def configure_colors(self, worker):
+        """Read colors of vertices into worker.
+
+        Args:
+            worker (Worker2D): worker with vertices and seed
+        """
         if val := self.params.child('Цвета точек').value():
-            self.worker.vertices_colors = parse_colors(val)
+            worker.vertices_colors = parse_colors(val)
 
         if not self.params.child('Цвета точек').value():
-            self.worker.vertices_colors =\
-                ['#000000'] * len(self.worker.vertices)
+            worker.vertices_colors = ['#000000'] * len(worker.vertices)
 
         if self.params.child('Случайные цвета').value():
-            self.worker.vertices_colors = self.worker.gen_random_colors()
+            # Same colors every restyle of seeded run
+            if worker.seed is not None:
+                worker.random.seed(worker.seed)
 
-        self.worker.inside = self.params.child('Рисовать точки внутри').value()
-        # self.worker.double_mid =\
-        #     self.params.child('Рисовать вторую середину').value()
+            worker.vertices_colors = worker.gen_random_colors()
 
-        if val := self.params.child('Стратегия').value():
-            strategy_path = Path(val)
-            # Добавляем родительскую директорию в sys.path
-            sys.path.append(str(strategy_path.parent))
-            # Импортируем модуль
-            module = __import__(strategy_path.stem)
-            self.worker.strategy = module.strategy
+    def compute_settings(self) -> dict:
+        """Values of parameters that affect the chaos game result.
+
+        Returns:
+            dict: values by name
+        """
+        return {p.name(): p.value() for p in self.params.children()
+                if p.name() not in PRESENTATION_PARAMS}
+
+    def params_changed(self, _, changes):
+        """Restyle shown points when only presentation changed."""
+        names = {param.name() for param, change, _ in changes
+                 if change == 'value'}
+
+        if names and names <= PRESENTATION_PARAMS:
+            self.restyle()
+
+        if 'Фрактальная размерность' in names:
+            if self.points is not None:
+                self.analyze(*self.points[:2])
+            elif self.stored is not None:
+                self.analyze(store=self.stored)
+
+    def restyle(self):
+        """Redraw shown points and overlays with current presentation."""
+        if self.points is None and self.stored is None\
+                or self.pyramid_layer is not None:
+            return
+
+        self.configure_colors(self.worker)
+
+        self.hide_density()
+        self.canvas_2d.clear()
+        self.canvas_2d.addItem(self.scatter_2d)
+        self.draw_overlays()
+
+        if self.stored is not None:
+            self.show_store(self.stored)
+        else:
+            self.show_points(*self.points)
+
+    def result_cache(self):
+        """Cache of results from settings.
+
+        Returns:
+            ResultCache | None: None if cache is off
+        """
+        from Cache import ResultCache
+
+        if not (directory := self.params.child('Директория кэша').value()):
+            return None
+
+        size = self.params.child('Размер кэша (МБ)').value()
+
+        return ResultCache(directory, size * 2**20)
+
+    def configure_occupancy(self, worker, export=False):
+        """Stop adaptive run when picture at target resolution is done.
+
+        Args:
+            worker (Worker2D): configured worker
+            export (bool, optional): resolution of export instead of
+                2d canvas. Defaults to False.
+        """
+        worker.occupancy = None
+        if not self.params.child('Адаптивное количество итераций').value():
+            return
+
+        width = self.graphics_widget_2d.width()
+        if export:
+            width = self.params_exp.child('Ширина изображения (тайлы)').value()\
+                or round(EXPORT_FIGURE_WIDTH * self.params_exp.child('dpi').value())
+
+        extent = worker.window or (worker.xmin, worker.xmax,
+                                   worker.ymin, worker.ymax)
+        threshold = self.params.child('Порог новых пикселей').value()
+
+        worker.occupancy = Occupancy(extent, width, threshold)
+
+    def configure_time_budget(self, worker, export=False):
+        """Limit run by wall-clock time, see iterations.
+
+        Args:
+            worker (Worker2D | Worker3D): worker to configure
+            export (bool, optional): budget of export instead of preview.
+                Defaults to False.
+        """
+        params = self.params_exp if export else self.params
+        worker.time_budget = params.child('Бюджет времени (с)').value() or None
+
+        # Deadline is checked between chunks, overshoot is a chunk at most
+        if worker.time_budget:
+            worker.chunk_size = min(worker.chunk_size, 2**9)
+
+    def iterations(self, worker) -> int:
+        """Number of iterations of configured run.
+
+        Runs with time budget go on until it runs out, adaptive runs until
+        picture stops changing, 'Количество итераций' is ignored then.
+
+        Args:
+            worker (Worker2D | Worker3D): worker with time budget and,
+                if 2d, occupancy
+        """
+        if worker.time_budget:
+            return UNBOUNDED_ITERATIONS
+
+        if getattr(worker, 'occupancy', None) is not None:
+            return ADAPTIVE_ITERATIONS
+
+        return safe_eval(self.params.child('Количество итераций').value())
+
+    def read_config(self):
+        """Read GUI settings and write them to variables."""
+        self.configure_worker(self.worker)
+
+        xmin, xmax = self.worker.xmin, self.worker.xmax
+        ymin, ymax = self.worker.ymin, self.worker.ymax
+
+        self.canvas_2d.setXRange(xmin, xmax)
+        self.canvas_2d.setYRange(ymin, ymax)
+
+        self.draw_overlays()
+
+    def draw_overlays(self):
+        """Draw borders and absolute on 2d canvas."""
+        xmin, xmax = self.worker.xmin, self.worker.xmax
 
         if self.params.child('Рисовать границы').value():
             width = 3.0
@@ -333,9 +649,6 @@ class Application:
                                     pen=pg.mkPen('#000000',
                                     width=width))
 
-        if val := self.params.child('Тип репера').value():
-            self.worker.frame_type = val
-
         if self.params.child('Рисовать абсолют').value():
             color = '#ff0000'
             if val := self.params.child('Цвет абсолюта').value():
@@ -379,32 +692,47 @@ class Application:
                                              skipFiniteCheck=True)
                 self.canvas_2d.addItem(hyperbole)
 
-            d = {'shapely & polygon': self.worker.checker,
-                 'shapely': self.worker.shapely_default_checker,
-                 'polygon': self.worker.polygon_default_checker}
-
-            self.worker.checker = d[self.params.child('Алгоритм').value()]
-
-    def plot_2d(self, rel=None, export_function=None):
+    def plot_2d(self, rel=None, export_function=None, priority=INTERACTIVE,
+                key='plot_2d'):
         """Run chaos game and plot with ScatterPlot.
 
+        Previous run with the same key that is still running is cancelled,
+        every export sweep has its own key, so neither plots nor other
+        sweeps cancel it. Export run superseded by a newer plot still
+        exports, its points just aren't shown.
+
         Args:
             rel (_type_, optional): relation for segment division.
                 Defaults to None.
-            export_function (_type_, optional): export right after the plot.
-                Defaults to None.
+            export_function (_type_, optional): export right after the plot,
+                called with the worker of the run. Defaults to None.
+            priority (int, optional): scheduler priority.
+                Defaults to INTERACTIVE.
+            key (str, optional): scheduler key of the run.
+                Defaults to 'plot_2d'.
 
         """
+        # Seeded run with the same settings gives the same points
+        if rel is None and export_function is None\
+                and self.points is not None\
+                and self.pyramid_layer is None\
+                and self.params.child('Зерно').value()\
+                and self.compute_settings() == self.plotted_settings:
+            self.restyle()
+            return
+
         self.main_window.setWindowTitle('pyv PLOTTING')
+        self.cancel_refinement()
+        self.hide_pyramid()
+        self.hide_density()
+        self.points = None
+        self.stored = None
         self.canvas_2d.clear()
         self.canvas_2d.addItem(self.scatter_2d)
 
-        # To avoid
-        # RuntimeError: wrapped C/C++ object of type Worker has been deleted
-        del self.worker
-
-        self.worker = Worker2D()
+        self.worker = worker = Worker2D()
         self.read_config()
+        self.show_prediction(worker)
 
         if not rel:
             values = self.params.child('lambda').value()
@@ -412,40 +740,453 @@ class Application:
 
             rel = float(values[0])
 
-        cnt = safe_eval(self.params.child('Количество итераций').value())
+        self.configure_occupancy(worker, export=export_function is not None)
+        self.configure_time_budget(worker, export=export_function is not None)
+        cnt = self.iterations(worker)
+
+        settings = self.compute_settings()
+
+        def work_finished(x, y, indices, stats):
+            # Not superseded by the newer plot
+            if worker is self.worker:
+                if stats is None:
+                    self.stats_label.setText('from cache')
+                else:
+                    self.show_stats(stats)
+                    logger.info('run %s', json.dumps(stats.to_dict()))
+
+                self.plotted_settings = settings
+                self.show_points(x, y, indices)
+                self.analyze(x, y)
+
+                self.main_window.setWindowTitle('pyv DONE')
+
+            if export_function:
+                export_function(x, y, worker.colorize(indices), rel, worker)
+
+        def store_finished(store, stats):
+            if worker is self.worker:
+                self.show_stats(stats)
+                logger.info('run %s', json.dumps(stats.to_dict()))
+
+                self.show_store(store)
+                self.analyze(store=store)
+
+                self.main_window.setWindowTitle('pyv DONE')
+
+            if export_function:
+                export_function(None, None, None, rel, worker, store=store)
+
+        worker.args = (cnt,)
+        worker.kwargs = {'rel': rel}
+
+        # Exports larger than RAM go to disk chunk by chunk
+        if export_function is not None\
+                and (directory := self.params_exp.child('Директория точек').value()):
+            from Store import ShardWriter
+
+            # Raw chunks, cleaned into lambda_<value> after the run
+            worker.store = ShardWriter(
+                Path(directory) / f'lambda_{rel}' / 'raw',
+                meta={'vertices_colors': list(worker.vertices_colors),
+                      'rel': rel},
+            )
+
+        # Unseeded and time-limited runs differ every time, nothing to reuse
+        cache = self.result_cache()
+        if cache is not None and worker.seed is not None\
+                and worker.time_budget is None and worker.store is None:
+            key = cache.key(worker.run_settings(cnt, rel))
+            if (cached := cache.get(key)) is not None:
+                work_finished(cached['x'], cached['y'], cached['indices'],
+                              None)
+                return
+
+            worker.cache, worker.cache_key = cache, key
+
+        # Run in separate thread
+        worker.signals.progress.connect(self.show_stats)
+        worker.signals.result.connect(work_finished)
+        worker.signals.stored.connect(store_finished)
+
+        self.submit(worker, priority, key=key)
+
+    def submit(self, job, priority, key=None, output=None):
+        """Submit job to scheduler, under profiler if profiling is on.
+
+        Args:
+            job: job with run() and, optionally, cancel()
+            priority (int): scheduler priority
+            key (str, optional): key of job in scheduler. Defaults to None.
+            output (Path, optional): file the job writes, profile is
+                written next to it. Defaults to None, i.e. the default
+                directory.
+        """
+        if profiling_enabled(self.params.child('Профилирование').value()):
+            if output is None:
+                directory = self.params_exp.child('Директория по умолчанию').value()
+                name = key or type(job).__name__
+                output = Path(directory or Path.cwd())\
+                    / f'profile_{name}_{time.strftime("%Y%m%d_%H%M%S")}'
+
+            job = ProfiledJob(job, Path(output).with_suffix(''))
+
+        self.scheduler.submit(job, priority, key)
+
+    def analyze(self, *coords, store=None):
+        """Estimate box-counting dimension of points in background.
+
+        Args:
+            *coords (np.ndarray): x, y or x, y, z coordinates
+            store (PointStore, optional): points on disk instead of coords.
+                Defaults to None.
+        """
+        from Analysis import DimensionJob
+
+        self.show_analysis('dimension', None)
+        if not self.params.child('Фрактальная размерность').value():
+            self.scheduler.cancel('analysis')
+            return
+
+        job = DimensionJob(*coords, store=store)
+        self.analysis_job = job
+
+        def analysis_finished(result):
+            # Superseded by analysis of the newer run
+            if job is not self.analysis_job:
+                return
+
+            self.show_analysis(
+                'dimension',
+                'box dimension: too few usable scales' if result is None
+                else result.summary(),
+            )
+
+        job.signals.result.connect(analysis_finished)
+
+        self.submit(job, BACKGROUND, key='analysis')
+
+    def show_analysis(self, topic: str, text: str | None):
+        """Set or remove line of analysis panel.
+
+        Args:
+            topic (str): e.g. 'dimension'
+            text (str | None): line, None removes it
+        """
+        if text is None:
+            self.analysis_lines.pop(topic, None)
+        else:
+            self.analysis_lines[topic] = text
+
+        self.analysis_label.setText('\n'.join(self.analysis_lines.values()))
+
+    def show_prediction(self, worker):
+        """Show long run vertex frequencies of compiled strategy.
+
+        Args:
+            worker (Worker2D): configured worker
+        """
+        if worker.transitions is None:
+            self.show_analysis('strategy', None)
+            return
+
+        freq = worker.transitions.stationary()
+        shown = ' '.join(f'{f:.2f}' for f in freq[:12])
+        if len(freq) > 12:
+            shown += ' ...'
+
+        text = f'vertex frequencies: {shown}'
+        if unused := np.count_nonzero(freq < 1e-9):
+            text += f'\nnever visited vertices: {unused}'
+
+        self.show_analysis('strategy', text)
+
+    def show_stats(self, stats):
+        """Show counters of run in the panel under parameters.
+
+        Args:
+            stats (RunStats): counters
+        """
+        self.stats_label.setText(stats.summary())
 
+    def point_size(self) -> float:
+        """Size of points on 2d canvas."""
         size = 1.0
         if val := self.params.child('Размер точки').value():
             size = val
 
-        def work_finished(x, y, colors):
-            x, y, colors = self.worker.clean(x, y, colors)
+        return size
+
+    def point_brushes(self, indices) -> np.ndarray:
+        """Brushes of points, one brush object per vertex.
 
+        Args:
+            indices (np.ndarray): vertex of every point
+
+        Returns:
+            np.ndarray: brush of every point
+        """
+        brushes = np.empty(len(self.worker.vertices_colors), dtype=object)
+        brushes[:] = [pg.mkBrush(c) for c in self.worker.vertices_colors]
+
+        return brushes[indices]
+
+    def show_points(self, x, y, indices):
+        """Show points on 2d canvas, as density image if there are many.
+
+        Args:
+            x (np.ndarray): x coordinates
+            y (np.ndarray): y coordinates
+            indices (np.ndarray): vertex of every point
+        """
+        self.points = (x, y, indices)
+        self.hide_density()
+
+        # Scatter items get slow with many points
+        threshold = self.params.child('Порог плотностного режима').value()
+        if threshold and len(x) > threshold:
+            self.scatter_2d.clear()
+            self.density_layer = DensityLayer(self.canvas_2d, x, y,
+                                              self.worker.colorize(indices))
+        else:
             self.scatter_2d.setData(x=x,
                                     y=y,
-                                    size=size,
-                                    brush=colors)
+                                    size=self.point_size(),
+                                    brush=self.point_brushes(indices))
 
-            self.main_window.setWindowTitle('pyv DONE')
+    def show_store(self, store):
+        """Show points on disk as density image.
 
-            if export_function:
-                export_function(x, y, colors, rel)
+        Args:
+            store (PointStore): points with vertex indices
+        """
+        self.points = None
+        self.stored = store
+        self.hide_density()
+
+        self.scatter_2d.clear()
+        self.density_layer = StoredDensityLayer(
+            self.canvas_2d, store, self.worker.vertices_colors,
+            lambda job: self.submit(job, INTERACTIVE, key='density'),
+        )
 
-        # Run in separate thread
-        self.worker.args = (cnt,)
-        self.worker.kwargs = {'rel': rel}
-        self.worker.signals.result.connect(work_finished)
+    def add_points(self, x, y, indices):
+        """Add points to the shown ones.
+
+        Args:
+            x (np.ndarray): x coordinates
+            y (np.ndarray): y coordinates
+            indices (np.ndarray): vertex of every point
+        """
+        points = tuple(np.concatenate([old, new])
+                       for old, new in zip(self.points, (x, y, indices),
+                                           strict=True))
+
+        threshold = self.params.child('Порог плотностного режима').value()
+        if self.density_layer is not None:
+            self.points = points
+            self.density_layer.add_points(x, y, self.worker.colorize(indices))
+        elif threshold and len(points[0]) > threshold:
+            self.show_points(*points)
+        else:
+            self.points = points
+            self.scatter_2d.addPoints(x=x,
+                                      y=y,
+                                      size=self.point_size(),
+                                      brush=self.point_brushes(indices))
+
+    def view_changed(self, *_):
+        """Restart refinement delay on every change of 2d view range."""
+        if not self.params.child('Уточнять при масштабировании').value():
+            return
+
+        if self.points is None or self.pyramid_layer is not None:
+            return
+
+        self.refine_timer.start(
+            self.params.child('Задержка уточнения (мс)').value(),
+        )
+
+    def cancel_refinement(self):
+        """Stop pending and running refinement."""
+        self.refine_timer.stop()
+
+        self.scheduler.cancel('refine')
+        self.refine_worker = None
+
+    def refine_view(self):
+        """Add points of the run that records only the visible range."""
+        (xmin, xmax), (ymin, ymax) = self.canvas_2d.getViewBox().viewRange()
+
+        w = self.worker
+        xmin, xmax = max(xmin, w.xmin), min(xmax, w.xmax)
+        ymin, ymax = max(ymin, w.ymin), min(ymax, w.ymax)
+
+        # Whole picture is computed already, only zoomed view lacks points
+        view_area = max(xmax - xmin, 0) * max(ymax - ymin, 0)
+        if not 0 < view_area < 0.8 * (w.xmax - w.xmin) * (w.ymax - w.ymin):
+            return
+
+        self.cancel_refinement()
+
+        worker = Worker2D()
+        self.configure_worker(worker)
+        worker.window = (xmin, xmax, ymin, ymax)
+        worker.streaming = True
+        # Only points in cells not shown yet are added
+        worker.known = self.points[:2]
+
+        def chunk_ready(x, y, indices):
+            # Superseded job may still send what it had
+            if worker is self.refine_worker:
+                self.add_points(x, y, indices)
+
+        def refine_finished(*_):
+            if worker is self.refine_worker:
+                self.refine_worker = None
+                self.main_window.setWindowTitle('pyv DONE')
+
+        # Same run as shown, only recording differs
+        worker.kwargs = dict(self.worker.kwargs)
+        # Count is unbounded when the budget ends the run, adaptive run
+        # stops when the window at canvas resolution is done
+        worker.time_budget = self.worker.time_budget
+        worker.chunk_size = self.worker.chunk_size
+        self.configure_occupancy(worker)
+        worker.args = (self.iterations(worker),)
+        worker.signals.partial.connect(chunk_ready)
+        worker.signals.result.connect(refine_finished)
+
+        self.refine_worker = worker
+        self.main_window.setWindowTitle('pyv REFINING')
+
+        self.submit(worker, REFINE, key='refine')
+
+    def hide_density(self):
+        """Stop showing points as density image."""
+        if self.density_layer is None:
+            return
+
+        self.density_layer.detach()
+        self.density_layer = None
+        # Counting of stored points for the view
+        self.scheduler.cancel('density')
 
-        self.worker.threadpool.start(self.worker)
+    def build_pyramid(self):
+        """Run chaos game once and build tile pyramid from the result."""
+        from Pyramid import PyramidBuilder, TilePyramid
+
+        self.main_window.setWindowTitle('pyv BUILDING PYRAMID')
+
+        worker = Worker2D()
+        self.configure_worker(worker)
+
+        values = self.params.child('lambda').value()
+        rel = float(values.replace(' ', '').split(',')[0])
+        cnt = safe_eval(self.params.child('Количество итераций').value())
+
+        pyramid = TilePyramid(self.params.child('Директория пирамиды').value())
+        builder = PyramidBuilder(
+            worker,
+            pyramid,
+            cnt,
+            rel,
+            self.params.child('Уровни пирамиды').value(),
+            settings=self.compute_settings(),
+        )
+
+        builder.signals.finished.connect(self.show_pyramid)
+
+        self.submit(builder, BACKGROUND, key='pyramid')
+
+    def show_pyramid(self):
+        """Show tile pyramid from disk instead of points."""
+        from Pyramid import PyramidLayer, TilePyramid
+
+        pyramid = TilePyramid(self.params.child('Директория пирамиды').value())
+        if not pyramid.manifest:
+            self.main_window.setWindowTitle('pyv NO PYRAMID')
+            return
+
+        self.hide_pyramid()
+        self.hide_density()
+        self.canvas_2d.clear()
+        self.read_config()
+
+        self.pyramid_layer = PyramidLayer(pyramid,
+                                          self.canvas_2d,
+                                          refine=self.refine_pyramid)
+
+        self.main_window.setWindowTitle('pyv DONE')
+
+    def hide_pyramid(self):
+        """Stop showing tile pyramid."""
+        if self.pyramid_layer is None:
+            return
+
+        self.pyramid_layer.detach()
+        self.pyramid_layer = None
+
+    def refine_pyramid(self, level: int, tiles: list):
+        """Fill missing tiles of level by the run focused on them.
+
+        Args:
+            level (int): pyramid level
+            tiles (list): (tx, ty) of missing tiles
+        """
+        from Raster import palette_index
+
+        layer = self.pyramid_layer
+        pyramid = layer.pyramid
+
+        extents = [pyramid.tile_extent(level, *t) for t in tiles]
+
+        # Pyramids built before settings were kept use current ones
+        settings = pyramid.manifest.get('settings') or\
+            self.compute_settings()
+
+        worker = Worker2D()
+        self.configure_worker(worker, settings)
+        if len(colors := pyramid.manifest['vertices_colors']) == len(worker.vertices):
+            worker.vertices_colors = colors
+
+        # The game goes through the whole attractor, only tiles are recorded
+        worker.window = (min(e[0] for e in extents), max(e[1] for e in extents),
+                         min(e[2] for e in extents), max(e[3] for e in extents))
+
+        rel = float(settings['lambda'].replace(' ', '').split(',')[0])
+        cnt = safe_eval(settings['Количество итераций'])
+
+        def refine_finished(x, y, indices, _):
+            # Another pyramid or points are shown already
+            if self.pyramid_layer is not layer:
+                return
+
+            index = palette_index(worker.colorize(indices), pyramid.palette)
+            pyramid.accumulate(level, x, y, index, tiles=tiles)
+            pyramid.save_manifest()
+
+            layer.refined(level, tiles)
+
+        worker.args = (cnt,)
+        worker.kwargs = {'rel': rel}
+        worker.signals.result.connect(refine_finished)
+
+        self.submit(worker, REFINE)
 
     def plot_3d(self):
         """Run chaos game and plot with GLScatterPlot."""
+        import pyqtgraph.opengl as gl
+
+        from Iterate3D import Worker3D
+
+        self.init_canvas_3d()
         self.main_window.setWindowTitle('pyv PLOTTING')
 
         self.graphics_widget_3d.clear()
         self.graphics_widget_3d.addItem(self.scatter_3d)
 
-        self.worker_3d = Worker3D()
+        self.worker_3d = worker = Worker3D()
         self.worker_3d.vertices =\
             parse_vertices(self.params.child('Вершины').value())
         self.worker_3d.start_point = Point(1, 1, 1)
@@ -529,13 +1270,19 @@ class Application:
         ygrid.rotate(90, 1, 0, 0)
 
         relation = float(self.params.child('lambda').value())
-        cnt = safe_eval(self.params.child('Количество итераций').value())
 
         size = 1.0
         if val := self.params.child('Размер точки').value():
             size = val
 
-        def work_finished(x, y, z, colors):
+        def work_finished(x, y, z, colors, stats):
+            # Superseded by the newer plot
+            if worker is not self.worker_3d:
+                return
+
+            self.show_stats(stats)
+            logger.info('run %s', json.dumps(stats.to_dict()))
+
             # if len(x) < 1000:
             #     self.plot_3d()
 
@@ -549,50 +1296,120 @@ class Application:
                                     color=colors,
                                     size=10 * size,
                                     pxMode=True)
+            self.analyze(x, y, z)
 
             self.main_window.setWindowTitle('pyv DONE')
 
+        self.configure_time_budget(self.worker_3d)
+        cnt = self.iterations(self.worker_3d)
+        self.worker_3d.storage = self.params.child('Хранение координат').value()
+
         # run in separate thread
         self.worker_3d.args = (cnt,)
         self.worker_3d.kwargs = {'rel': relation}
+        self.worker_3d.signals.progress.connect(self.show_stats)
         self.worker_3d.signals.result.connect(work_finished)
-        self.worker_3d.threadpool.start(self.worker_3d)
+
+        self.submit(self.worker_3d, INTERACTIVE, key='plot_3d')
 
     def export_2d(self):
         """Export image to file with matplotlib."""
+        from Exporter import Exporter2D
+
+        if self.params_exp.child('Кадры анимации').value() > 0:
+            self.export_animation()
+            return
+
         self.main_window.setWindowTitle('pyv EXPORTING')
 
-        def plot_finished(x, y, colors, rel):
+        def plot_finished(x, y, colors, rel, worker, store=None):
             self.main_window.setWindowTitle('pyv EXPORTING')
 
             exporter = Exporter2D(
-                self.worker,
+                worker,
                 self.params,
                 self.params_exp,
                 x,
                 y,
                 colors,
                 lamb=rel,
+                store=store,
             )
             # exporter.args = (self.worker, self.params, self.params_exp,
             #                  x, y, colors, rel)
             exporter.kwargs = {}
             exporter.signals.finished.connect(work_finished)
 
-            exporter.threadpool.start(exporter)
+            self.submit(exporter, BACKGROUND,
+                        output=exporter.output_path())
 
         def work_finished():
             self.main_window.setWindowTitle('pyv DONE')
 
             if relations:
                 self.plot_2d(rel=relations.pop(),
-                             export_function=plot_finished)
+                             export_function=plot_finished,
+                             priority=BACKGROUND,
+                             key=key)
 
         values = self.params.child('lambda').value()
         values = values.replace(' ', '').split(',')
         relations = set(map(float, values))
 
-        self.plot_2d(rel=relations.pop(), export_function=plot_finished)
+        self.export_sweeps += 1
+        key = f'export_{self.export_sweeps}'
+
+        self.plot_2d(rel=relations.pop(),
+                     export_function=plot_finished,
+                     priority=BACKGROUND,
+                     key=key)
+
+    def export_animation(self):
+        """Export frames with lambda and vertices changing from first to last."""
+        from Animation import AnimationExporter
+
+        self.main_window.setWindowTitle('pyv EXPORTING')
+
+        worker = Worker2D()
+        self.configure_worker(worker)
+
+        # First and last values of 'lambda' are the ends of the animation
+        values = self.params.child('lambda').value()
+        values = [float(i) for i in values.replace(' ', '').split(',')]
+
+        vertices_end = worker.vertices
+        if val := self.params_exp.child('Конечные вершины').value():
+            vertices_end = parse_vertices(val)
+
+        # Vertices move one to one, frames can't be made otherwise
+        if len(vertices_end) != len(worker.vertices):
+            logger.error("'Конечные вершины' has %d vertices, plot has %d",
+                         len(vertices_end), len(worker.vertices))
+            self.main_window.setWindowTitle('pyv VERTEX COUNT MISMATCH')
+            return
+
+        cnt = safe_eval(self.params.child('Количество итераций').value())
+
+        exporter = AnimationExporter(
+            worker,
+            self.params,
+            self.params_exp,
+            vertices_end,
+            (values[0], values[-1]),
+            cnt,
+        )
+
+        def progress(written, total):
+            self.main_window.setWindowTitle(f'pyv EXPORTING {written}/{total}')
+
+        def work_finished():
+            self.main_window.setWindowTitle('pyv DONE')
+
+        exporter.signals.progress.connect(progress)
+        exporter.signals.finished.connect(work_finished)
+
+        self.submit(exporter, BACKGROUND, key='animation',
+                    output=exporter.output_path())
 
     def export_3d(self):
         """TODO."""
@@ -682,6 +1499,8 @@ class Application:
                   {'plot': self.plot_3d, 'export': self.export_3d}]
 
         idx = tab_widget.currentIndex()
+        if idx == 1:
+            self.init_canvas_3d()
 
         button_plot.clicked.connect(choice[idx]['plot'])
         button_export.clicked.connect(choice[idx]['export'])
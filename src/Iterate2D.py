@@ -1,20 +1,26 @@
 """Module that perfoms chaos game on plane."""
 
+import shutil
 from itertools import pairwise
-from math import acos, inf, pi, sqrt
-from random import choice, uniform
+from math import acos, ceil, inf, pi, sqrt
+from random import Random
+from time import perf_counter
 
 import numpy as np
-from pyqtgraph.Qt.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
-from shapely.geometry import Point, Polygon
-from shapely.prepared import prep
+from pyqtgraph.Qt.QtCore import QObject, pyqtSignal
 
+from Buffers import INITIAL_CAPACITY, Buffer, CoordinateBuffer
 from Constants import PRECISION
-from Geometry import Line
+from Dedup import GridDedup
+from Geometry import EdgeIndex, Line
 from Point import Point2, Point3
 from SpecialFunctions import harmonic, phi, phi_bar, phi_big, u1, u2, u3
+from Stats import RunStats
 from Utility import isclose_prec, signum
 
+# Start points drawn at once for restarts of stuck chains
+RESTART_BATCH = 2**4
+
 
 class WorkerSignals(QObject):
     """Defines the signals available from a running worker thread.
@@ -22,20 +28,34 @@ class WorkerSignals(QObject):
     Supported signals are:
 
     result
-        numpy arrays x, y, colors returned
+        numpy arrays x, y, indices of cleaned points, index is of the
+        vertex the point came from, and RunStats of the run
+
+    partial
+        numpy arrays x, y, indices of points found since the previous
+        partial, emitted every chunk if streaming is on
+
+    progress
+        RunStats snapshot, emitted every chunk
+
+    stored
+        PointStore of cleaned points and RunStats, emitted instead of
+        result when points are written to disk
 
+    Cancelled run emits neither result nor stored.
     """
 
-    result = pyqtSignal(object, object, object)
+    result = pyqtSignal(object, object, object, object)
+    partial = pyqtSignal(object, object, object)
+    progress = pyqtSignal(object)
+    stored = pyqtSignal(object, object)
 
 
-class Worker2D(QRunnable):
+class Worker2D:
     """Main class that «plays» chaos game with settings."""
 
     def __init__(self):
-        # For threading
-        super().__init__()
-        self.threadpool = QThreadPool()
+        # For running in Scheduler
         self.args = ()
         self.kwargs = {}
         self.signals = WorkerSignals()
@@ -45,13 +65,25 @@ class Worker2D(QRunnable):
         self.checker = lambda p: \
             self.shapely_default_checker(p)\
             and self.polygon_default_checker(p)
-        self.strategy = lambda verticies, _: choice(verticies)
+        # Own source of randomness, seeding it doesn't touch other runs
+        self.random = Random()
+        self.strategy = lambda verticies, _: self.random.choice(verticies)
         self.vertices_colors = []
         self.inside = True
         self.frame_type = 2
 
         self.precision = PRECISION
         self.decimals = 9
+        # Storage of recorded coordinates, see Buffers.STORAGES; quantized
+        # storages are relative to window or limits
+        self.storage = 'float64'
+        # Side of dedup cell, e.g. pixel size, None means 10**-decimals
+        self.dedup_cell = None
+        # GridDedup of the run, recorded points are filtered every chunk
+        self.dedup = None
+        # x, y of points kept before, e.g. shown ones, their cells are
+        # skipped by dedup
+        self.known = None
 
         self.xmin = -inf
         self.xmax = inf
@@ -59,8 +91,72 @@ class Worker2D(QRunnable):
         self.ymin = -inf
         self.ymax = inf
 
+        # xmin, xmax, ymin, ymax: points outside are not recorded,
+        # but the game goes on through them
+        self.window = None
+
+        # Cancellation is checked and partial results are sent every chunk
+        self.chunk_size = 2**12
+        self.streaming = False
+        self.cancelled = False
+        self.stats = RunStats()
+
+        # TransitionTable of strategy, vertices are drawn from it instead
+        # of calling strategy every step
+        self.transitions = None
+
+        # Region that checks coordinate arrays, used for batches,
+        # see Region.py; checker stays the one point version of it
+        self.region = None
+        self.region_source = ''
+
+        # Settings and (triangles, cumulative areas) of the area where
+        # start points are drawn, see start_area
+        self.start_triangles = None
+
+        # Seed of self.random for reproducible runs, None means fresh run
+        self.seed = None
+        # Identify strategy and checker in run settings
+        self.strategy_source = ''
+        self.algorithm = 'shapely & polygon'
+
+        # Seconds the run may take, checked every chunk, None means no limit
+        self.time_budget = None
+        self.deadline = None
+
+        # 'random' is the chaos game, 'frontier' applies every vertex to
+        # every point level by level, see work_frontier
+        self.engine = 'random'
+        self.frontier_size = 2**12
+        self.frontier_resolution = 2**10
+
+        # Chain is restarted from a new start point after this many
+        # rejected steps in a row, 0 means never
+        self.max_rejections = 2**8
+
+        # Occupancy: stop when picture at its resolution stops changing,
+        # iterations count is the upper bound then
+        self.occupancy = None
+
+        # ResultCache and key to store the result under
+        self.cache = None
+        self.cache_key = None
+
+        # ShardWriter: points of every chunk go to disk instead of memory,
+        # for runs larger than RAM; they are cleaned into the parent of
+        # its directory after the run, see clean_store
+        self.store = None
+
+    def cancel(self):
+        """Ask running game to stop after the current chunk."""
+        self.cancelled = True
+
     def prepare_shapely_checker(self):
         """Prepare shapely polygon for fast checking that point is in."""
+        import shapely
+        from shapely.geometry import Point, Polygon
+        from shapely.prepared import prep
+
         vertices_2d = [i.to_lower_dimension().to_float()
                        for i in self.vertices]
 
@@ -68,6 +164,12 @@ class Worker2D(QRunnable):
 
         self.poly = Polygon(pairs).buffer(0.1, quad_segs=2**7)
         self.poly_prep = prep(self.poly)
+        shapely.prepare(self.poly)
+        # Point class of shapely_default_checker, imported once here
+        self.shapely_point = Point
+
+        # Depend on polygon, built again on first start point
+        self.start_triangles = None
 
     def prepare_polygon_checker(self):
         """Point is in = signs in line equation match starting point signs. So prepare these signs."""
@@ -78,6 +180,9 @@ class Worker2D(QRunnable):
         self.equations = [Line(a, b).equation
                           for a, b in pairwise(vertices_2d)]
 
+        # Boundary crossings of the hyperbolic branch of div_in_rel
+        self.edge_index = EdgeIndex(vertices_2d[:-1])
+
         point_inside = self.start_point
         if not point_inside:
             point_inside = self.gen_start_point().to_lower_dimension()
@@ -85,11 +190,24 @@ class Worker2D(QRunnable):
         self.signs = [signum(f(point_inside[1], point_inside[2]))
                       for f in self.equations]
 
+    def colorize(self, indices) -> np.ndarray:
+        """Colors of points by their vertices.
+
+        Args:
+            indices (np.ndarray): index of vertex of every point
+
+        Returns:
+            np.ndarray: color of every point
+        """
+        return np.asarray(self.vertices_colors, dtype=str)[
+            np.asarray(indices, dtype=np.intp)
+        ]
+
     def gen_random_colors(self) -> list:
         """Generate random colors in format #123456 for each vertex."""
         data = '0123456789ABCDEF'
 
-        return ['#' + ''.join([choice(data) for _ in range(6)])
+        return ['#' + ''.join([self.random.choice(data) for _ in range(6)])
                 for _ in range(len(self.vertices))]
 
     def shapely_default_checker(self, point: Point3) -> bool:
@@ -103,7 +221,7 @@ class Worker2D(QRunnable):
         """
         cur = point.to_lower_dimension().to_float()
 
-        return self.poly_prep.contains(Point(*cur.coords))
+        return self.poly_prep.contains(self.shapely_point(*cur.coords))
 
     def polygon_default_checker(self, point: Point3) -> bool:
         r"""Use fact that we have polygon. Point signs in line equations should be the same as starting point.
@@ -124,20 +242,147 @@ class Worker2D(QRunnable):
 
         return True
 
+    def shapely_mask(self, x, y) -> np.ndarray:
+        """Vectorized shapely_default_checker.
+
+        Args:
+            x (np.ndarray): x coordinates
+            y (np.ndarray): y coordinates
+
+        Returns:
+            np.ndarray: mask of points in polygon
+        """
+        import shapely
+
+        return shapely.contains_xy(self.poly, x, y)
+
+    def polygon_mask(self, x, y) -> np.ndarray:
+        """Vectorized polygon_default_checker.
+
+        Args:
+            x (np.ndarray): x coordinates
+            y (np.ndarray): y coordinates
+
+        Returns:
+            np.ndarray: mask of points in polygon
+        """
+        mask = np.ones(len(x), dtype=bool)
+        for f, sign in zip(self.equations, self.signs, strict=True):
+            cur = np.sign(f(x, y))
+            mask &= (cur == 0) | (cur == sign)
+
+        return mask
+
+    def start_area(self):
+        """Area where start points are drawn.
+
+        Inside: polygon itself, not buffered, so every point passes polygon
+        checker too. Outside: limits, or guessed limits if infinite, minus
+        buffered polygon.
+
+        Returns:
+            shapely.Geometry: polygon or multipolygon
+        """
+        import shapely
+        from shapely.geometry import Polygon, box
+
+        xmin, xmax, ymin, ymax = self.xmin, self.xmax, self.ymin, self.ymax
+        if not np.isfinite([xmin, xmax, ymin, ymax]).all():
+            xmin, xmax, ymin, ymax = self.guess_limits()
+        frame = box(xmin, ymin, xmax, ymax)
+
+        if not self.inside:
+            return frame.difference(self.poly)
+
+        pairs = [i.to_lower_dimension().to_float().to_tuple()
+                 for i in self.vertices]
+        polygon = shapely.make_valid(Polygon(pairs))
+
+        return polygon.intersection(frame)
+
+    def triangulate_start_area(self) -> tuple[np.ndarray, np.ndarray]:
+        """Triangles of start area and their cumulative areas, cached.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: corners of shape (n, 3, 2) and
+                cumulative areas, empty if area is empty
+        """
+        import shapely
+
+        settings = (self.inside, self.xmin, self.xmax, self.ymin, self.ymax)
+        if self.start_triangles is not None \
+                and self.start_triangles[0] == settings:
+            return self.start_triangles[1]
+
+        parts = shapely.get_parts(
+            shapely.constrained_delaunay_triangles(self.start_area()))
+        # Closed rings of 4 points, the last repeats the first
+        corners = shapely.get_coordinates(parts).reshape(-1, 4, 2)[:, :3]
+
+        a = corners[:, 1] - corners[:, 0]
+        b = corners[:, 2] - corners[:, 0]
+        areas = np.abs(a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]) / 2
+
+        triangles = corners, np.cumsum(areas)
+        self.start_triangles = settings, triangles
+
+        return triangles
+
+    def gen_start_points(self, count: int) -> list[Point3]:
+        """Random points of start area, uniform by area.
+
+        Triangle is chosen with probability proportional to its area, then
+        point is uniform in it, so no point is rejected. Falls back to
+        rejection sampling if start area is empty.
+
+        Args:
+            count (int): number of points
+
+        Returns:
+            list[Point3]: points inside, or outside if not self.inside
+        """
+        corners, cumulative = self.triangulate_start_area()
+        if not len(cumulative) or cumulative[-1] <= 0:
+            return [self.reject_start_point() for _ in range(count)]
+
+        rng = np.random.default_rng(self.random.getrandbits(64))
+
+        idx = np.searchsorted(cumulative, rng.uniform(0, cumulative[-1], count),
+                              side='right')
+        idx = np.minimum(idx, len(cumulative) - 1)
+        a, b, c = corners[idx, 0], corners[idx, 1], corners[idx, 2]
+
+        r = rng.uniform(size=(2, count, 1))
+        # Points of the other half of parallelogram are reflected back
+        flip = r.sum(axis=0) > 1
+        r = np.where(flip, 1 - r, r)
+
+        points = a + r[0] * (b - a) + r[1] * (c - a)
+
+        return [Point3(x, y, 1) for x, y in points.tolist()]
+
     def gen_start_point(self) -> Point3:
+        """Randomly choose starting point, see gen_start_points.
+
+        Returns:
+            Point3: random point inside
+        """
+        return self.gen_start_points(1)[0]
+
+    def reject_start_point(self) -> Point3:
         """Randomly choose starting point using shapely polygon bounds method.
 
         Returns:
             Point3: random point inside
         """
-        x = uniform(self.xmin, self.xmax)
-        y = uniform(self.ymin, self.ymax)
+        x = self.random.uniform(self.xmin, self.xmax)
+        y = self.random.uniform(self.ymin, self.ymax)
 
         # Point is from shapely.geometry
         # while not self.shapely_default(Point3(x,  y, 1)):
         while self.shapely_default_checker(Point3(x,  y, 1)) != self.inside:
-            x = uniform(self.xmin, self.xmax)
-            y = uniform(self.ymin, self.ymax)
+            x = self.random.uniform(self.xmin, self.xmax)
+            y = self.random.uniform(self.ymin, self.ymax)
 
         return Point3(x, y, 1)
 
@@ -226,15 +471,18 @@ class Worker2D(QRunnable):
         val = phi_big(m, b)
 
         if val > 0:
+            self.stats.branches['elliptic'] += 1
             mu = rel / (1 + rel)
 
             return Point3(*[coord(i, m, b, mu) for i in range(1, 4)])
         if isclose_prec(abs(val), 0):
+            self.stats.branches['parabolic'] += 1
             from mid_first_lambda_parabolic import coord
 
             return Point3(*[coord(i, m, b, rel) for i in range(1, 4)])
 
         # val < 0
+        self.stats.branches['hyperbolic'] += 1
         if isclose_prec(abs(phi_bar(m, b)), 0):
             c1 = Point3(*[
                 coord(i, m, b, rel / (1 + rel))
@@ -251,26 +499,18 @@ class Worker2D(QRunnable):
             return c2
 
         # phi_bar(m, b) \neq 0
-        vertices_2d = [i.to_lower_dimension().to_float()
-                       for i in self.vertices]
-        vertices_2d += [vertices_2d[0]]
-
-        h_points = []
-        for bi, bj in pairwise(vertices_2d):
-            line_m_b = Line(m.to_lower_dimension().to_float(),
-                            b.to_lower_dimension().to_float())
-
-            result = line_m_b.intersect(Line(bi, bj))
-
-            if result not in vertices_2d:
-                h_points.append(
-                    result.to_bigger_dimension(1),
-                )
+        h_points = [
+            point.to_bigger_dimension(1)
+            for point in self.edge_index.crossings(
+                m.to_lower_dimension().to_float(),
+                b.to_lower_dimension().to_float(),
+            )
+        ]
 
         if not h_points:
             return Point3(inf, inf, inf)
 
-        h: Point3 = choice(h_points)
+        h: Point3 = self.random.choice(h_points)
 
         b_star = Point3(-b[2] * u3(m, b) - b[3] * u2(m, b),
                         b[1] * u3(m, b) + b[3] * u1(m, b),
@@ -312,95 +552,594 @@ class Worker2D(QRunnable):
 
         return Point3(*[coord(i, m, b, mu) for i in range(1, 4)])
 
-    @pyqtSlot()
+    def run_settings(self, cnt: int, rel) -> dict:
+        """Everything that determines the result of a seeded run.
+
+        Args:
+            cnt (int): number of iterations
+            rel (float): relation for segment division
+
+        Returns:
+            dict: JSON serializable settings, see ResultCache.key
+        """
+        return {
+            'vertices': [i.to_float().to_list() for i in self.vertices],
+            'start_point': self.start_point.to_float().to_list(),
+            'rel': rel,
+            'strategy': self.strategy_source,
+            'algorithm': self.algorithm,
+            'region': self.region_source,
+            'limits': [self.xmin, self.xmax, self.ymin, self.ymax],
+            'window': self.window,
+            'inside': self.inside,
+            'frame_type': self.frame_type,
+            'cnt': cnt,
+            'seed': self.seed,
+            'convergence': None if self.occupancy is None
+            else [self.occupancy.width, self.occupancy.threshold],
+            'engine': self.engine,
+            'frontier': [self.frontier_size, self.frontier_resolution]
+            if self.engine == 'frontier' else None,
+            'dedup': [self.decimals, self.dedup_cell],
+            'max_rejections': self.max_rejections,
+            'storage': self.storage,
+        }
+
     def run(self):
         """Run worker in separate thread."""
-        x, y, colors = self.work(*self.args, **self.kwargs)
+        if self.seed is not None:
+            self.random.seed(self.seed)
 
-        min_length = 32
-        min_tries = 3
+        self.deadline = None
+        if self.time_budget:
+            self.deadline = perf_counter() + self.time_budget
 
-        cnt = 0
-        while len(x) < min_length and cnt < min_tries:
-            self.start_point = self.gen_start_point()
-            x, y, colors = self.work(*self.args, **self.kwargs)
+        # Frontier follows strategy only through its transition table,
+        # other strategies are played by the random walk
+        work = self.work
+        if self.engine == 'frontier'\
+                and (self.transitions is not None or not self.strategy_source):
+            work = self.work_frontier
 
-            cnt += 1
+        # Set of cells grows with the run, stored runs are larger than RAM
+        # and are cleaned afterwards with clean_store
+        self.dedup = None
+        if self.store is None:
+            self.dedup = GridDedup(self.decimals, self.dedup_cell)
 
-        self.signals.result.emit(x, y, colors)
+        self.stats = RunStats()
+        # Stuck chains are restarted by work itself
+        work(*self.args, **self.kwargs)
+        self.dedup = None
 
-    def work(self, cnt: int, rel=1):
-        """Start chaos game."""
-        def add_point(point: Point2,
-                      x: list[float],
-                      y: list[float],
-                      vert,
-                      colors) -> bool:
-            bounds = point.isfinite()\
-                     and self.xmin <= point[1] <= self.xmax\
-                     and self.ymin <= point[2] <= self.ymax
-
-            if not bounds:
-                return False
+        # Points of stopped run are neither shown nor exported
+        if self.cancelled:
+            if self.store is not None:
+                shutil.rmtree(self.store.close().directory)
+            return
+
+        if self.store is not None:
+            raw = self.store.close()
+            store = self.clean_store(raw, raw.directory.parent)
+            shutil.rmtree(raw.directory)
+
+            self.signals.stored.emit(store, self.stats)
+            return
+
+        # Points were deduplicated chunk by chunk already
+        x, y, indices = self.unique_points()
+
+        if self.cache is not None:
+            self.cache.put(self.cache_key, x=x, y=y, indices=indices)
+
+        self.signals.result.emit(x, y, indices, self.stats)
+
+    def buffers(self, cnt: int) -> tuple[CoordinateBuffer, CoordinateBuffer,
+                                         Buffer]:
+        """Empty buffers for points of the run.
+
+        Args:
+            cnt (int): number of iterations, at most that many points
+
+        Returns:
+            tuple[CoordinateBuffer, CoordinateBuffer, Buffer]: x, y and
+                index of vertex
+        """
+        xmin, xmax, ymin, ymax = self.window or\
+            (self.xmin, self.xmax, self.ymin, self.ymax)
+        capacity = min(cnt, INITIAL_CAPACITY)
+
+        return (CoordinateBuffer(self.storage, xmin, xmax, capacity),
+                CoordinateBuffer(self.storage, ymin, ymax, capacity),
+                Buffer(np.int32, capacity))
+
+    def record(self, point: Point2, vert: Point3, x, y, indices) -> bool:
+        """Record point found by the game.
+
+        Args:
+            point (Point2): new point
+            vert (Point3): vertex the point came from
+            x (CoordinateBuffer): recorded x's
+            y (CoordinateBuffer): recorded y's
+            indices (Buffer): recorded vertices
+
+        Returns:
+            bool: point is within limits, i.e. the game goes on from it
+        """
+        stats = self.stats
+
+        bounds = point.isfinite()\
+            and self.xmin <= point[1] <= self.xmax\
+            and self.ymin <= point[2] <= self.ymax
+
+        if not bounds:
+            stats.rejected_bounds += 1
+            return False
+
+        stats.accepted += 1
+
+        if self.window is not None:
+            xmin, xmax, ymin, ymax = self.window
+            if not (xmin <= point[1] <= xmax and ymin <= point[2] <= ymax):
+                stats.outside_window += 1
+                return True
+
+        x.append(point[1])
+        y.append(point[2])
+        indices.append(self.vertices.index(vert))
+
+        return True
+
+    def divide(self, cur: Point2, b: Point3, rel) -> Point3 | None:
+        """Divide segment from current point to vertex.
+
+        Args:
+            cur (Point2): current point
+            b (Point3): vertex
+            rel (float): relation for segment division
+
+        Returns:
+            Point3 | None: new point or None if it isn't finite
+        """
+        stats = self.stats
+        stats.steps += 1
+
+        m = self.div_in_rel(Point3(*cur.coords, 1), b,
+                            rel=rel, inside=self.inside)
 
-            x.append(point[1])
-            y.append(point[2])
-            colors.append(self.vertices_colors[self.vertices.index(vert)])
+        # Would be dropped by record anyway
+        if not m.isfinite():
+            stats.rejected_nonfinite += 1
+            return None
 
+        return m
+
+    def step(self, cur: Point2, b: Point3, rel) -> Point2 | None:
+        """Divide segment from current point to vertex and check result.
+
+        Args:
+            cur (Point2): current point
+            b (Point3): vertex
+            rel (float): relation for segment division
+
+        Returns:
+            Point2 | None: new point or None if rejected
+        """
+        m = self.divide(cur, b, rel)
+        if m is None:
+            return None
+
+        if self.checker(m) != self.inside:
+            self.stats.rejected_checker += 1
+            return None
+
+        return m.to_lower_dimension().to_float()
+
+    def check_batch(self, points: list[Point3]) -> np.ndarray:
+        """Check many points at once.
+
+        Args:
+            points (list[Point3]): finite points
+
+        Returns:
+            np.ndarray: mask of points on the right side of checker
+        """
+        if self.region is None:
+            return np.array([self.checker(m) == self.inside for m in points],
+                            dtype=bool)
+
+        coords = [m.to_lower_dimension().to_float() for m in points]
+        x = np.array([c[1] for c in coords], dtype=float)
+        y = np.array([c[2] for c in coords], dtype=float)
+
+        return self.region(x, y) == self.inside
+
+    def start_chunks(self):
+        """Reset bookkeeping of chunks before the run."""
+        self.__sent = 0
+        self.__checked = 0
+        self.__deduped = 0
+        # Kept points in storage of buffers, decoded on output
+        self.__unique = []
+        self.__decoders = (None, None)
+
+        if self.dedup is not None:
+            self.dedup.clear()
+            if self.known is not None:
+                self.dedup.filter(*self.known)
+
+    def end_chunk(self, x, y, indices) -> bool:
+        """Check cancellation, time budget, convergence and send progress.
+
+        Args:
+            x (CoordinateBuffer): recorded x's
+            y (CoordinateBuffer): recorded y's
+            indices (Buffer): recorded vertices
+
+        Returns:
+            bool: run should stop
+        """
+        stats = self.stats
+
+        if self.cancelled:
             return True
 
-        x_coords: list[float] = []
-        y_coords: list[float] = []
-        colors: list[str] = []
+        if self.deadline is not None and perf_counter() >= self.deadline:
+            stats.stopped = 'time budget'
+            return True
+
+        if self.occupancy is not None:
+            self.occupancy.add(x.view(self.__checked),
+                               y.view(self.__checked))
+            self.__checked = len(x)
+
+            if self.occupancy.converged():
+                stats.stopped = 'converged'
+                return True
+
+        self.signals.progress.emit(stats.snapshot())
+        self.dedup_chunk(x, y, indices)
+        self.send_partial(x, y, indices)
+        self.release_chunk(x, y, indices)
+
+        return False
+
+    def dedup_chunk(self, x, y, indices):
+        """Keep points recorded since the previous chunk in new cells.
+
+        Kept points stay in storage of buffers, with store they are
+        written to it.
+        """
+        if self.dedup is None and self.store is None\
+                or self.__deduped == len(x):
+            return
+
+        chunk = (x.raw(self.__deduped),
+                 y.raw(self.__deduped),
+                 indices.view(self.__deduped))
+        self.__deduped = len(x)
+        self.__decoders = (x.decode, y.decode)
+
+        if self.dedup is not None:
+            mask = self.dedup.filter(x.decode(chunk[0]), y.decode(chunk[1]))
+            chunk = tuple(column[mask] for column in chunk)
+
+        self.__unique.append(chunk)
+
+        if self.store is not None:
+            chunk_x, chunk_y, chunk_indices = self.decode(chunk)
+            self.store.append(x=chunk_x, y=chunk_y, indices=chunk_indices)
+
+    def release_chunk(self, x, y, indices):
+        """Forget recorded points once they are kept or written to store.
+
+        Memory of buffers stays bounded by a chunk, only kept points grow.
+        """
+        if self.store is None and self.dedup is None:
+            return
+
+        for buffer in (x, y, indices):
+            buffer.clear()
+
+        self.__checked = 0
+        self.__deduped = 0
+
+        # Offset in buffers unless partials are sent from kept chunks
+        if self.dedup is None or self.store is not None:
+            self.__sent = 0
+
+        if self.store is not None:
+            self.__unique = []
+
+    def decode(self, chunk):
+        """Coordinates of kept chunk in float."""
+        decode_x, decode_y = self.__decoders
+        chunk_x, chunk_y, chunk_indices = chunk
+
+        return decode_x(chunk_x), decode_y(chunk_y), chunk_indices
+
+    def unique_points(self):
+        """Deduplicated points of the run.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: x, y and index of
+                vertex every point came from
+        """
+        if not self.__unique:
+            return np.empty(0), np.empty(0), np.empty(0, dtype=np.int32)
+
+        return self.decode(tuple(np.concatenate(parts)
+                                 for parts in zip(*self.__unique, strict=True)))
+
+    def send_partial(self, x, y, indices):
+        """Send points recorded since the previous partial if streaming.
+
+        Only points in new cells are sent when run deduplicates.
+        """
+        if not self.streaming:
+            return
+
+        if self.dedup is None:
+            if self.__sent < len(x):
+                self.signals.partial.emit(x.view(self.__sent),
+                                          y.view(self.__sent),
+                                          indices.view(self.__sent))
+                self.__sent = len(x)
+            return
+
+        for chunk in self.__unique[self.__sent:]:
+            if len(chunk[0]):
+                self.signals.partial.emit(*self.decode(chunk))
+        self.__sent = len(self.__unique)
+
+    def finish_chunks(self, x, y, indices):
+        """Send the rest of points and final progress.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: x, y and index of
+                vertex every point came from, with store or dedup only
+                points of the last chunk, see unique_points
+        """
+        self.dedup_chunk(x, y, indices)
+        self.send_partial(x, y, indices)
+
+        self.stats.stop()
+        self.signals.progress.emit(self.stats.snapshot())
+
+        for buffer in (x, y, indices):
+            buffer.trim()
+
+        return x.view(), y.view(), indices.view()
+
+    def work(self, cnt: int, rel=1):
+        """Start chaos game.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: x, y and index of
+                vertex every point came from
+        """
+        x_coords, y_coords, indices = self.buffers(cnt)
 
         prev: list[Point3] = []
         cur: Point2 = self.start_point.to_lower_dimension()
 
-        print(cur)
-
-        divison_function = self.div_in_rel
-        for _ in range(cnt):
-            b: Point3 = self.strategy(self.vertices, prev)
-            m = divison_function(
-                Point3(*cur.coords, 1),
-                b,
-                rel=rel,
-                inside=self.inside,
+        sampler = None
+        if self.transitions is not None:
+            # Seeded by self.random, so seeded runs stay reproducible
+            sampler = self.transitions.sampler(
+                np.random.default_rng(self.random.getrandbits(64)),
             )
 
-            if self.checker(m) != self.inside:
+        # Rejected steps in a row and start points for restarts
+        rejections = 0
+        starts: list[Point3] = []
+
+        self.start_chunks()
+        self.stats.start()
+
+        for step in range(cnt):
+            if step and step % self.chunk_size == 0\
+                    and self.end_chunk(x_coords, y_coords, indices):
+                break
+
+            if self.max_rejections and rejections >= self.max_rejections:
+                # Chain is stuck, start it again instead of spending
+                # the rest of the run on it
+                if not starts:
+                    starts = self.gen_start_points(RESTART_BATCH)
+
+                cur = starts.pop().to_lower_dimension()
+                prev = []
+                if sampler is not None:
+                    sampler.history = ()
+
+                rejections = 0
+                self.stats.restarts += 1
+
+            if sampler is None:
+                b: Point3 = self.strategy(self.vertices, prev)
+            else:
+                idx = sampler.next()
+                b = self.vertices[idx]
+
+            m = self.step(cur, b, rel)
+            if m is None or not self.record(m, b, x_coords, y_coords, indices):
+                rejections += 1
                 continue
 
-            m = m.to_lower_dimension().to_float()
+            rejections = 0
+            prev.append(b)
+            cur = m
+
+            if sampler is not None:
+                sampler.push(idx)
+
+        return self.finish_chunks(x_coords, y_coords, indices)
+
+    def work_frontier(self, cnt: int, rel=1):
+        """Apply division to every vertex for every point of frontier.
+
+        Level by level instead of random walk: every point of the frontier
+        is divided with every vertex, divided points are checked in
+        batches. New points are deduplicated on grid of
+        `frontier_resolution` cells across limits, only points in cells not
+        seen before form the next frontier, at most `frontier_size` of them,
+        evenly spaced. With transition table of strategy only vertices it
+        allows after history of the point are applied, and cells are told
+        apart by history too.
+
+        Args:
+            cnt (int): maximum number of divisions
+            rel (float, optional): relation for segment division.
+                Defaults to 1.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: x, y and index of
+                vertex every point came from
+        """
+        x_coords, y_coords, indices = self.buffers(cnt)
+
+        cell = max(self.xmax - self.xmin, self.ymax - self.ymin)\
+            / self.frontier_resolution
+        visited = set()
+
+        table = self.transitions
+        every = (np.arange(len(self.vertices)), None)
+
+        # Points with history of vertices, empty without table
+        frontier: list[tuple[Point2, tuple]] =\
+            [(self.start_point.to_lower_dimension(), ())]
+
+        self.start_chunks()
+        stats = self.stats
+        stats.start()
+
+        def check_pending(level):
+            """Check divided points in one batch, keep new cells."""
+            if not pending:
+                return
 
-            if add_point(m,
-                         x_coords,
-                         y_coords,
-                         vert=b,
-                         colors=colors):
-                prev.append(b)
-                cur = m
+            mask = self.check_batch([m for m, _, _ in pending])
+            stats.rejected_checker += int(np.count_nonzero(~mask))
 
-        return np.array(x_coords), np.array(y_coords), np.array(colors)
+            for (m, b, history), good in zip(pending, mask.tolist(),
+                                             strict=True):
+                if not good:
+                    continue
 
-    def clean(self, x, y, colors):
+                m = m.to_lower_dimension().to_float()
+                key = (int((m[1] - self.xmin) // cell),
+                       int((m[2] - self.ymin) // cell), history)
+                if key in visited:
+                    continue
+
+                if self.record(m, b, x_coords, y_coords, indices):
+                    visited.add(key)
+                    level.append((m, history))
+
+            pending.clear()
+
+        # Divided points waiting for checker, with history after them
+        pending: list[tuple[Point3, Point3, tuple]] = []
+
+        while frontier and stats.steps < cnt:
+            level: list[tuple[Point2, tuple]] = []
+
+            for cur, history in frontier:
+                allowed, _ = every if table is None\
+                    else table.transitions[history]
+
+                for idx in allowed.tolist():
+                    if stats.steps >= cnt:
+                        break
+
+                    if stats.steps and stats.steps % self.chunk_size == 0:
+                        check_pending(level)
+                        if self.end_chunk(x_coords, y_coords, indices):
+                            return self.finish_chunks(x_coords, y_coords, indices)
+
+                    b = self.vertices[idx]
+                    m = self.divide(cur, b, rel)
+                    if m is not None:
+                        after = () if table is None\
+                            else table.next_history(history, idx)
+                        pending.append((m, b, after))
+
+            check_pending(level)
+
+            if len(level) > self.frontier_size:
+                spacing = len(level) / self.frontier_size
+                level = [level[int(i * spacing)]
+                         for i in range(self.frontier_size)]
+
+            frontier = level
+
+        return self.finish_chunks(x_coords, y_coords, indices)
+
+    def clean(self, x, y, indices):
         """Take quotient of points by digits parameter.
 
         Args:
             x (List[float]): x's coordinates
             y (List[float]): y's coordinates
-            colors (List[str]): color of every point
+            indices (List[int]): vertex of every point
 
         Returns:
-            tuple[List[float], List[float], List[str]]: result of cleaning
+            tuple[List[float], List[float], List[int]]: result of cleaning
         """
-        x = np.round(x, decimals=self.decimals)
-        y = np.round(y, decimals=self.decimals)
+        x = np.asarray(x)
+        y = np.asarray(y)
+
+        mask = GridDedup(self.decimals, self.dedup_cell).filter(x, y)
+
+        return x[mask], y[mask], np.asarray(indices)[mask]
+
+    def clean_store(self, store, directory):
+        """Take quotient of stored points out of core.
+
+        Points are split on disk into buckets by ranges of cell columns, a
+        cell is in one bucket only, then buckets are cleaned one by one.
+        Memory is bounded by a bucket, about a shard for spread points.
+        Points come out grouped by bucket.
+
+        Args:
+            store (PointStore): points to clean
+            directory (str | Path): where to write the result
+
+        Returns:
+            PointStore: cleaned points
+        """
+        from Store import SHARD_SIZE, Partition, ShardWriter
+
+        cell = GridDedup(self.decimals, self.dedup_cell).cell
+        writer = ShardWriter(directory, meta=store.meta)
+
+        low, high = inf, -inf
+        for (x,) in store.chunks('x'):
+            x = x[np.isfinite(x)]
+            if len(x):
+                low, high = min(low, x.min()), max(high, x.max())
+
+        if low > high:
+            return writer.close()
+
+        first = np.floor(low / cell)
+        columns = np.floor(high / cell) - first + 1
+        buckets = max(ceil(len(store) / SHARD_SIZE), 1)
+
+        def bucket_of(x, *_):
+            column = np.floor(np.asarray(x) / cell) - first
+            # Non-finite points get -1 and are dropped
+            bucket = np.nan_to_num(column * buckets // columns, nan=-1,
+                                   posinf=-1, neginf=-1)
 
-        _, idx = np.unique(x + 1j * y, return_index=True)
+            return bucket.astype(np.int64)
 
-        x = np.take(x, idx)
-        y = np.take(y, idx)
-        colors = np.take(colors, idx, mode='clip')
+        with Partition(store, bucket_of, buckets, ('x', 'y', 'indices'),
+                       directory=directory) as partition:
+            for bucket in range(buckets):
+                x, y, indices = partition.get(bucket)
+                mask = GridDedup(self.decimals, self.dedup_cell).filter(x, y)
+                writer.append(x=x[mask], y=y[mask], indices=indices[mask])
 
-        return x, y, colors
+        return writer.close()
@@ -1,9 +1,9 @@
 """Module that perfoms chaos game in space."""
 
-# import cProfile
 from math import inf
 from random import choice, uniform
-from typing import List, Tuple
+from time import perf_counter
+from typing import Tuple
 
 import numpy as np
 from pyqtgraph.Qt.QtCore import *
@@ -11,8 +11,10 @@ from pyqtgraph.Qt.QtGui import *
 from pyqtgraph.Qt.QtWidgets import *
 from shapely.geometry import Point, Polygon
 
+from Buffers import INITIAL_CAPACITY, Buffer, CoordinateBuffer
 from Mid3D import get_coords
 from Point import Point2, Point3, Point
+from Stats import RunStats
 from Utility import PRECISION
 from scipy.spatial import ConvexHull
 
@@ -30,20 +32,22 @@ class WorkerSignals(QObject):
         tuple (exctype, value, traceback.format_exc() )
 
     result
-        object data returned from processing, anything
+        x, y, z, colors and RunStats of the run
+
+    progress
+        RunStats snapshot, sent every chunk
 
     '''
     finished = pyqtSignal()
     error = pyqtSignal(tuple)
-    result = pyqtSignal(object, object, object, object)
+    result = pyqtSignal(object, object, object, object, object)
+    progress = pyqtSignal(object)
 
 
-class Worker3D(QRunnable):
+class Worker3D:
     """Main class that «plays» chaos game with settings."""
     def __init__(self):
-        # For threading
-        super(Worker3D, self).__init__()
-        self.threadpool = QThreadPool()
+        # For running in Scheduler
         self.args = None
         self.kwargs = None
         self.signals = WorkerSignals()
@@ -59,6 +63,8 @@ class Worker3D(QRunnable):
 
         self.precision = PRECISION
         self.decimals = 3
+        # Storage of recorded coordinates, see Buffers.STORAGES
+        self.storage = 'float64'
 
         self.xmin = -inf
         self.xmax = inf
@@ -66,6 +72,21 @@ class Worker3D(QRunnable):
         self.ymin = -inf
         self.ymax = inf
 
+        self.cancelled = False
+
+        # Cancellation, time budget and progress are checked every chunk,
+        # 3d steps build convex hulls and are much slower than 2d ones
+        self.chunk_size = 2**8
+        self.stats = RunStats()
+
+        # Seconds the run may take, None means no limit
+        self.time_budget = None
+        self.deadline = None
+
+    def cancel(self):
+        """Ask running game to stop."""
+        self.cancelled = True
+
     @property
     def vertices(self) -> list:
         return self._vertices
@@ -196,11 +217,15 @@ class Worker3D(QRunnable):
 
         return answer
 
-    @pyqtSlot()
     def run(self):
+        self.deadline = None
+        if self.time_budget:
+            self.deadline = perf_counter() + self.time_budget
+
+        self.stats = RunStats()
         x, y, z, colors = self.work(*self.args, **self.kwargs)
 
-        self.signals.result.emit(x, y, z, colors)
+        self.signals.result.emit(x, y, z, colors, self.stats)
 
     def work(self, cnt: int, rel=1):
         """Main method that «plays» chaos game."""
@@ -215,25 +240,42 @@ class Worker3D(QRunnable):
             x.append(point[1])
             y.append(point[2])
             z.append(point[3])
-            colors.append(self.vertices_colors[self.vertices.index(vert)])
+            # Vertex index, colors are looked up once at the end
+            colors.append(self.vertices.index(vert))
 
             return True
 
-        x_coords:List[float] = []
-        y_coords:List[float] = []
-        z_coords:List[float] = []
-        colors:List[str] = []
+        capacity = min(cnt, INITIAL_CAPACITY)
+        # z has no limits, so it is never quantized
+        x_coords = CoordinateBuffer(self.storage, self.xmin, self.xmax, capacity)
+        y_coords = CoordinateBuffer(self.storage, self.ymin, self.ymax, capacity)
+        z_coords = CoordinateBuffer(self.storage, capacity=capacity)
+        colors = Buffer(np.int32, capacity)
 
         cur = self.start_point.to_bigger_dimension(1)
-        print(cur)
         # cur = self.start_point.to_point3(self.projective)
 
         # print(cur)
 
+        stats = self.stats
+        stats.start()
+
         # while len(x_coords) < cnt:
-        for _ in range(cnt):
+        for step in range(cnt):
+            if step and step % self.chunk_size == 0:
+                if self.cancelled:
+                    break
+
+                # Points found so far are the result
+                if self.deadline is not None and perf_counter() >= self.deadline:
+                    stats.stopped = 'time budget'
+                    break
+
+                self.signals.progress.emit(stats.snapshot())
+
             vertex = choice(self.vertices)
             result = self.div_in_rel(vertex, cur, rel=rel)
+            stats.steps += 1
 
             #print(vertex)
             #print(cur)
@@ -246,8 +288,13 @@ class Worker3D(QRunnable):
                          z_coords,
                          vert=vertex,
                          colors=colors):
+                stats.accepted += 1
                 cur = result.to_bigger_dimension(1)
                 # cur = result.to_point3(self.projective)
+            else:
+                # div_in_rel doesn't tell non-finite points from
+                # ones outside of hull
+                stats.rejected_checker += 1
 
             if self.double_mid:
                 for val in [rel, -rel]:
@@ -259,12 +306,12 @@ class Worker3D(QRunnable):
                               vert=vertex,
                               colors=colors)
 
-        x_coords = np.array(x_coords)
-        y_coords = np.array(y_coords)
-        z_coords = np.array(z_coords)
-        colors = np.array(colors)
+        stats.stop()
+        self.signals.progress.emit(stats.snapshot())
+
+        colors = np.asarray(self.vertices_colors)[colors.view()]
 
-        return x_coords, y_coords, z_coords, colors
+        return x_coords.view(), y_coords.view(), z_coords.view(), colors
 
     # TODO
     def clean(self, x, y, colors):
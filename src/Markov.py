@@ -0,0 +1,195 @@
+"""Strategies with finite memory as Markov chains over vertex indices.
+
+Strategy declares `memory = k` when its choice depends on the last k
+vertices only and it picks the vertex with `choice`. Then it is evaluated
+once for every history, the result is a transition table: history ->
+allowed next vertices with probabilities.
+"""
+
+from collections import deque
+
+import numpy as np
+
+# Histories to evaluate at most, bigger tables are left to Python
+MAX_STATES = 2**12
+
+# Vertices drawn at once for a history
+POOL_SIZE = 2**10
+
+# Stationary distribution
+MAX_ITERATIONS = 10**4
+TOLERANCE = 1e-12
+
+
+class TransitionTable:
+    """Next vertex distribution for every reachable history."""
+
+    def __init__(self, n: int, memory: int, transitions: dict):
+        """Create table.
+
+        Args:
+            n (int): number of vertices
+            memory (int): length of history
+            transitions (dict): history (tuple of at most memory
+                indices) -> next indices and their probabilities
+        """
+        self.n = n
+        self.memory = memory
+        self.transitions = transitions
+
+    def next_history(self, history: tuple, idx: int) -> tuple:
+        """History after vertex idx is accepted."""
+        if not self.memory:
+            return ()
+
+        return (*history, idx)[-self.memory:]
+
+    def sampler(self, rng) -> 'Sampler':
+        """Sampler of vertices starting with empty history.
+
+        Args:
+            rng (np.random.Generator): source of randomness
+        """
+        return Sampler(self, rng)
+
+    def stationary(self) -> np.ndarray:
+        """Long run frequency of every vertex.
+
+        Power iteration of the lazy chain over full histories, it has the
+        same stationary distribution, but isn't periodic.
+
+        Returns:
+            np.ndarray: frequencies, unreachable vertices get 0
+        """
+        if not self.memory:
+            idx, p = self.transitions[()]
+            freq = np.zeros(self.n)
+            np.add.at(freq, idx, p)
+
+            return freq
+
+        states = [h for h in self.transitions if len(h) == self.memory]
+        number = {h: i for i, h in enumerate(states)}
+
+        src, dst, weights = [], [], []
+        for h in states:
+            for idx, p in zip(*self.transitions[h], strict=True):
+                src.append(number[h])
+                dst.append(number[self.next_history(h, idx)])
+                weights.append(p)
+
+        src, dst = np.array(src), np.array(dst)
+        weights = np.array(weights)
+
+        pi = np.full(len(states), 1 / len(states))
+        for _ in range(MAX_ITERATIONS):
+            step = np.bincount(dst, weights=pi[src] * weights,
+                               minlength=len(states))
+            step = (pi + step) / 2
+
+            done = np.abs(step - pi).max() < TOLERANCE
+            pi = step
+            if done:
+                break
+
+        last = np.array([h[-1] for h in states])
+
+        return np.bincount(last, weights=pi, minlength=self.n)
+
+
+class Sampler:
+    """Draws next vertex for current history from pools drawn in bulk."""
+
+    def __init__(self, table: TransitionTable, rng):
+        """Start with empty history.
+
+        Args:
+            table (TransitionTable): chain
+            rng (np.random.Generator): source of randomness
+        """
+        self.table = table
+        self.rng = rng
+        self.history = ()
+        self.pools = {}
+
+    def next(self) -> int:
+        """Index of the next vertex, history doesn't change."""
+        pool = self.pools.get(self.history)
+        if not pool:
+            idx, p = self.table.transitions[self.history]
+            pool = self.rng.choice(idx, size=POOL_SIZE, p=p).tolist()
+            # Popped from the end
+            pool.reverse()
+            self.pools[self.history] = pool
+
+        return pool.pop()
+
+    def push(self, idx: int):
+        """Vertex idx was accepted."""
+        self.history = self.table.next_history(self.history, idx)
+
+
+def compile_strategy(source: str, n: int) -> TransitionTable | None:
+    """Transition table of strategy.
+
+    Strategy is executed from source in its own namespace, with `choice`
+    that records its argument, so the loaded strategy isn't touched.
+    Vertices are passed as their indices.
+
+    Args:
+        source (str): source of strategy module
+        n (int): number of vertices
+
+    Returns:
+        TransitionTable | None: None if strategy doesn't declare memory,
+            doesn't call choice exactly once or has too many histories
+    """
+    namespace = {}
+    try:
+        exec(compile(source, '<strategy>', 'exec'), namespace)  # noqa: S102
+    except Exception:  # noqa: BLE001
+        return None
+
+    memory = namespace.get('memory')
+    strategy = namespace.get('strategy')
+    if not isinstance(memory, int) or memory < 0 or strategy is None:
+        return None
+
+    calls = []
+
+    def choice(seq):
+        seq = list(seq)
+        calls.append(seq)
+
+        return seq[0]
+
+    namespace['choice'] = choice
+
+    vertices = list(range(n))
+    transitions = {}
+    queue = deque([()])
+    table = TransitionTable(n, memory, transitions)
+
+    while queue:
+        history = queue.popleft()
+        if history in transitions:
+            continue
+        if len(transitions) >= MAX_STATES:
+            return None
+
+        calls.clear()
+        try:
+            strategy(vertices, list(history))
+        except Exception:  # noqa: BLE001
+            return None
+
+        if len(calls) != 1 or not calls[0]:
+            return None
+
+        idx, counts = np.unique(calls[0], return_counts=True)
+        transitions[history] = (idx, counts / counts.sum())
+
+        for i in idx.tolist():
+            queue.append(table.next_history(history, i))
+
+    return table
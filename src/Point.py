@@ -2,12 +2,7 @@
 
 from cmath import isfinite
 
-import mpmath as mp
-
-from Constants import DIGITS
-from Utility import distance_inf, isclose_prec
-
-mp.mp.dps = DIGITS
+from Utility import distance_inf, isclose_prec, loaded_mpmath
 
 class Point:
     r"""A mutable n-dimensional point supporting real, complex, and arbitrary-precision coordinates.
@@ -24,6 +19,8 @@ class Point:
         1
         >>> p.to_tuple()
         (1, 2, 3)
+        >>> from Utility import load_mpmath
+        >>> mp = load_mpmath()
         >>> q = Point(mp.mpf('1.5'), mp.mpc('2+3j'))
         >>> q.isfinite()
         True
@@ -93,7 +90,8 @@ class Point:
             return False
         if len(self.coords) != len(other.coords):
             return False
-        if all(isinstance(x, mp.mpf) for x in self.coords):
+        mp = loaded_mpmath()
+        if mp is not None and all(isinstance(x, mp.mpf) for x in self.coords):
             return all(mp.almosteq(a, b)
                        for a, b in zip(self.coords, other.coords, strict=True))
         return isclose_prec(distance_inf(self, other), 0)
@@ -132,10 +130,12 @@ class Point:
         Returns:
             Point: A new point with real-valued coordinates.
         """
+        mp = loaded_mpmath()
+
         ans_coords = []
         for coord in self.coords:
             ans_coords.append(coord)
-            if isinstance(coord, mp.mpc):
+            if mp is not None and isinstance(coord, mp.mpc):
                 ans_coords[-1] = mp.re(coord)
             elif isinstance(coord, complex):
                 ans_coords[-1] = coord.real
@@ -182,6 +182,8 @@ class Point2(Point):
         >>> p = Point2(1.0, 2.0)
         >>> p.x, p[1]
         (1.0, 1.0)
+        >>> from Utility import load_mpmath
+        >>> mp = load_mpmath()
         >>> q = Point2(mp.mpc('1+2j'), 3)
         >>> q.is_complex()
         True
@@ -206,10 +208,13 @@ class Point2(Point):
         Returns:
             bool: True if at least one coordinate has a non-negligible imaginary component.
         """
+        mp = loaded_mpmath()
+        types = complex if mp is None else (complex, mp.mpc)
+
         return any(
             not isclose_prec(abs(coord.imag), 0)
             for coord in self.coords
-            if isinstance(coord, complex)
+            if isinstance(coord, types)
         )
 
 
@@ -225,10 +230,12 @@ class Point3(Point):
         >>> p = Point3(1.0, 2.0, 3.0)
         >>> p.z, p[3]
         (3.0, 3.0)
+        >>> from Utility import load_mpmath
+        >>> mp = load_mpmath()
         >>> q = Point3(mp.mpc('1+2j'), 3, mp.mpf('4.5'))
         >>> r = q.to_float()
         >>> r.x, r.y, r.z
-        (1.0, 3, 4.5)
+        (mpf('1.0'), 3, mpf('4.5'))
     """
 
     def __init__(self, x, y, z):
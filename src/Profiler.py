@@ -0,0 +1,198 @@
+"""Opt-in sampling profiler of background jobs.
+
+Stack of the job's thread is sampled every `interval` seconds. Result is
+written as collapsed stacks (`<stem>.folded`, input of flamegraph.pl,
+speedscope, inferno) and time per stage of chaos game (`<stem>.stages.json`).
+
+cProfile isn't used: since 3.12 it sees every thread, and GUI thread's
+calls get mixed into the job's stacks.
+"""
+
+import json
+import os
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from time import perf_counter
+
+# Stage of sample is the innermost function of the stack that is in here
+STAGES = {
+    'strategy': 'strategy',
+    'div_in_rel': 'div_in_rel',
+    'checker': 'checker',
+    'shapely_default_checker': 'checker',
+    'polygon_default_checker': 'checker',
+    'convex_trick': 'checker',
+    'add_point': 'add_point',
+    'record': 'add_point',
+    'clean': 'clean',
+    'export_2d': 'export',
+    'export_tiled': 'export',
+    'export_animation': 'export',
+}
+
+# While sampling, GIL holder is asked to give GIL away this soon, otherwise
+# samples fall on calls that release GIL (shapely) and miss the rest
+SWITCH_INTERVAL = 1e-5
+
+# Switch interval is process-wide: profilers running at once and the
+# interval before the first of them
+_switch_lock = threading.Lock()
+_switch_users = 0
+_switch_saved = None
+
+
+def lower_switch_interval():
+    """Lower switch interval for one more profiler."""
+    global _switch_users, _switch_saved
+
+    with _switch_lock:
+        if not _switch_users:
+            _switch_saved = sys.getswitchinterval()
+            sys.setswitchinterval(min(_switch_saved, SWITCH_INTERVAL))
+        _switch_users += 1
+
+
+def restore_switch_interval():
+    """Restore switch interval when the last profiler is done."""
+    global _switch_users
+
+    with _switch_lock:
+        _switch_users -= 1
+        if not _switch_users:
+            sys.setswitchinterval(_switch_saved)
+
+
+def profiling_enabled(toggle=False) -> bool:
+    """Profiling is on by GUI toggle or PYV_PROFILE environment variable.
+
+    Args:
+        toggle (bool, optional): GUI toggle. Defaults to False.
+    """
+    return toggle or os.environ.get('PYV_PROFILE', '') not in ('', '0')
+
+
+class SamplingProfiler:
+    """Samples stack of the thread that entered the context."""
+
+    def __init__(self, interval=0.001):
+        """Initialize.
+
+        Args:
+            interval (float, optional): seconds between samples.
+                Defaults to 0.001.
+        """
+        self.interval = interval
+        self.stacks = Counter()
+        self.elapsed = 0.0
+
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__target = None
+        self.__started = 0.0
+
+    def __enter__(self):
+        """Start sampling current thread."""
+        self.__target = threading.get_ident()
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self.__sample, daemon=True)
+
+        lower_switch_interval()
+
+        self.__started = perf_counter()
+        self.__thread.start()
+
+        return self
+
+    def __exit__(self, *_):
+        """Stop sampling."""
+        self.__stop.set()
+        self.__thread.join()
+        self.elapsed = perf_counter() - self.__started
+
+        restore_switch_interval()
+
+    def __sample(self):
+        while not self.__stop.wait(self.interval):
+            frame = sys._current_frames().get(self.__target)
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{Path(code.co_filename).stem}:{code.co_name}')
+                frame = frame.f_back
+
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stage_times(self) -> dict:
+        """Estimated seconds spent in every stage.
+
+        Returns:
+            dict: seconds by stage, 'other' is the rest of sampled time
+        """
+        samples = sum(self.stacks.values())
+        # Samples come a bit late, so scale to the wall time
+        scale = self.elapsed / samples if samples else 0.0
+
+        times = Counter()
+        for stack, cnt in self.stacks.items():
+            stage = 'other'
+            for frame in reversed(stack.split(';')):
+                name = frame.rsplit(':', 1)[-1]
+                if name in STAGES:
+                    stage = STAGES[name]
+                    break
+
+            times[stage] += cnt * scale
+
+        return dict(times)
+
+    def write(self, stem):
+        """Write collapsed stacks and stage times.
+
+        Args:
+            stem (str | Path): path without extension
+        """
+        stem = Path(stem)
+        stem.parent.mkdir(parents=True, exist_ok=True)
+
+        with stem.with_name(f'{stem.name}.folded').open('w', encoding='utf-8') as f:
+            for stack, cnt in self.stacks.most_common():
+                f.write(f'{stack} {cnt}\n')
+
+        report = {
+            'elapsed': self.elapsed,
+            'samples': sum(self.stacks.values()),
+            'stages': self.stage_times(),
+        }
+        with stem.with_name(f'{stem.name}.stages.json').open('w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+
+
+class ProfiledJob:
+    """Scheduler job that runs another job under SamplingProfiler."""
+
+    def __init__(self, job, stem):
+        """Wrap job.
+
+        Args:
+            job: job with run() and, optionally, cancel()
+            stem (str | Path): where to write results, see
+                SamplingProfiler.write
+        """
+        self.job = job
+        self.stem = stem
+
+    def cancel(self):
+        """Cancel wrapped job."""
+        if cancel := getattr(self.job, 'cancel', None):
+            cancel()
+
+    def run(self):
+        """Run wrapped job and write profile."""
+        with SamplingProfiler() as profiler:
+            self.job.run()
+
+        profiler.write(self.stem)
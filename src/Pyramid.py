@@ -0,0 +1,440 @@
+"""Quadtree pyramid of density tiles for zoomable exploration.
+
+Level L covers the square around the limits with 2^L x 2^L tiles of
+TILE x TILE pixels. Tile (tx, ty) is stored as per color counts in
+<directory>/<L>/<ty>_<tx>.npz, ty = 0 is the top row. Levels up to
+`levels` are built from one large run, deeper ones are filled lazily
+by focused runs.
+"""
+
+import json
+import shutil
+from collections import OrderedDict
+from math import ceil, floor, log2
+from pathlib import Path
+
+import numpy as np
+import pyqtgraph as pg
+from pyqtgraph.Qt.QtCore import QObject, QRectF, pyqtSignal
+
+from Raster import color_index, density, palette_index, shade, to_pixels
+
+TILE = 256
+MAX_LEVEL = 24
+
+
+class TilePyramid:
+    """On disk storage of density tiles."""
+
+    def __init__(self, directory):
+        """Open pyramid in directory, it may not exist yet.
+
+        Args:
+            directory (str | Path): pyramid directory
+        """
+        self.directory = Path(directory)
+        self.manifest = {}
+        self.cache = OrderedDict()
+        self.cache_size = 256
+
+        path = self.directory / 'manifest.json'
+        if path.exists():
+            with path.open(encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+    @property
+    def levels(self) -> int:
+        """Deepest level built from the large run."""
+        return self.manifest['levels']
+
+    @property
+    def palette(self) -> list[str]:
+        """Colors, counts of tiles are indexed by them."""
+        return self.manifest['palette']
+
+    def tile_path(self, level: int, tx: int, ty: int) -> Path:
+        """File of tile."""
+        return self.directory / str(level) / f'{ty}_{tx}.npz'
+
+    def tile_extent(self, level: int, tx: int, ty: int) -> tuple:
+        """Plane coordinates covered by tile.
+
+        Returns:
+            tuple: xmin, xmax, ymin, ymax
+        """
+        left, top, side = self.manifest['square']
+        size = side / 2**level
+
+        return (left + tx * size, left + (tx + 1) * size,
+                top - (ty + 1) * size, top - ty * size)
+
+    def build(self, x, y, colors, bounds, levels: int, palette=None):
+        """Build levels 0..levels from points of one run.
+
+        Counts are accumulated at the deepest level only, coarser levels
+        are sums of 2x2 pixel blocks of their children.
+
+        Args:
+            x (np.ndarray): x coordinates
+            y (np.ndarray): y coordinates
+            colors (np.ndarray): color of every point
+            bounds (tuple): xmin, xmax, ymin, ymax to cover
+            levels (int): deepest level
+            palette (list, optional): all colors that may appear, e.g.
+                vertices colors. Defaults to colors of points.
+        """
+        xmin, xmax, ymin, ymax = bounds
+        side = max(xmax - xmin, ymax - ymin)
+        left = (xmin + xmax - side) / 2
+        top = (ymin + ymax + side) / 2
+
+        palette, _ = color_index(colors if palette is None else palette)
+        index = palette_index(colors, palette)
+
+        # Remove only levels of the previous pyramid
+        for level_dir in self.directory.glob('[0-9]*'):
+            if level_dir.is_dir() and level_dir.name.isdigit():
+                shutil.rmtree(level_dir)
+        self.cache.clear()
+
+        self.manifest = {
+            'levels': levels,
+            'square': [left, top, side],
+            'palette': [str(i) for i in palette],
+            'norm': {},
+        }
+
+        self.accumulate(levels, x, y, index)
+        for level in range(levels - 1, -1, -1):
+            self.__downsample(level)
+
+        self.save_manifest()
+
+    def accumulate(self, level: int, x, y, index, tiles=None):
+        """Add points to tiles of level.
+
+        Args:
+            level (int): level to add to
+            x (np.ndarray): x coordinates
+            y (np.ndarray): y coordinates
+            index (np.ndarray): index of every point's color in palette
+            tiles (list, optional): (tx, ty) to update, these are written
+                even if empty and count as filled. Defaults to all tiles
+                with points.
+        """
+        left, top, side = self.manifest['square']
+        n = 2**level
+
+        rows, cols, mask = to_pixels(x, y, (left, left + side, top - side, top),
+                                     n * TILE, n * TILE)
+        keys = (rows[mask] // TILE) * n + cols[mask] // TILE
+
+        x, y, index = np.asarray(x)[mask], np.asarray(y)[mask], np.asarray(index)[mask]
+
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        x, y, index = x[order], y[order], index[order]
+
+        if tiles is None:
+            tiles = [(key % n, key // n) for key in np.unique(keys).tolist()]
+
+        norm = self.manifest['norm'].get(str(level), 1)
+        for tx, ty in tiles:
+            lo, hi = np.searchsorted(keys, [ty * n + tx, ty * n + tx + 1])
+
+            counts = density(x[lo:hi], y[lo:hi], index[lo:hi],
+                             len(self.palette),
+                             self.tile_extent(level, tx, ty), TILE, TILE)
+
+            if (old := self.load(level, tx, ty)) is not None:
+                counts += old
+
+            self.__save(level, tx, ty, counts)
+            norm = max(norm, int(counts.sum(axis=0).max()))
+
+        self.manifest['norm'][str(level)] = norm
+
+    def __downsample(self, level: int):
+        children = {}
+        for path in (self.directory / str(level + 1)).glob('*.npz'):
+            ty, tx = map(int, path.stem.split('_'))
+            children.setdefault((tx // 2, ty // 2), []).append((tx, ty))
+
+        half = TILE // 2
+        norm = 1
+        for (tx, ty), cur_children in children.items():
+            counts = np.zeros((len(self.palette), TILE, TILE), dtype=np.uint32)
+
+            for ctx, cty in cur_children:
+                child = self.load(level + 1, ctx, cty)
+                block = child.reshape(-1, half, 2, half, 2).sum(axis=(2, 4))
+
+                row, col = (cty % 2) * half, (ctx % 2) * half
+                counts[:, row:row + half, col:col + half] = block
+
+            self.__save(level, tx, ty, counts)
+            norm = max(norm, int(counts.sum(axis=0).max()))
+
+        self.manifest['norm'][str(level)] = norm
+
+    def __save(self, level: int, tx: int, ty: int, counts):
+        path = self.tile_path(level, tx, ty)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        np.savez_compressed(path, counts=counts)
+
+        self.cache[level, tx, ty] = counts
+        self.__trim_cache()
+
+    def __trim_cache(self):
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def save_manifest(self):
+        """Write manifest to disk."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        with (self.directory / 'manifest.json').open('w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=4)
+
+    def load(self, level: int, tx: int, ty: int):
+        """Counts of tile.
+
+        Returns:
+            np.ndarray | None: (k, TILE, TILE) counts or None if tile
+                is not on disk
+        """
+        key = (level, tx, ty)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        path = self.tile_path(level, tx, ty)
+        if not path.exists():
+            return None
+
+        with np.load(path) as data:
+            counts = data['counts']
+
+        self.cache[key] = counts
+        self.__trim_cache()
+
+        return counts
+
+    def is_filled(self, level: int, tx: int, ty: int) -> bool:
+        """Tile is known: built levels have no files for empty tiles."""
+        return level <= self.levels or self.tile_path(level, tx, ty).exists()
+
+    def norm(self, level: int) -> float:
+        """Count that gives full opacity on level."""
+        norms = self.manifest['norm']
+        if str(level) in norms:
+            return norms[str(level)]
+
+        # Deeper tiles share points between 4 times more pixels per level
+        return max(norms[str(self.levels)] / 4**(level - self.levels), 1)
+
+    def level_for(self, view_width: float, pixels: int) -> int:
+        """Level whose pixel is not larger than screen pixel.
+
+        Args:
+            view_width (float): width of visible range in plane coordinates
+            pixels (int): width of view in screen pixels
+
+        Returns:
+            int: level
+        """
+        side = self.manifest['square'][2]
+        ratio = side * max(pixels, 1) / (TILE * view_width)
+
+        return min(max(ceil(log2(max(ratio, 1))), 0), MAX_LEVEL)
+
+    def visible(self, level: int, view_extent) -> list[tuple[int, int]]:
+        """Tiles of level that intersect view.
+
+        Args:
+            level (int): level
+            view_extent (tuple): xmin, xmax, ymin, ymax of view
+
+        Returns:
+            list[tuple[int, int]]: (tx, ty) of tiles
+        """
+        left, top, side = self.manifest['square']
+        n = 2**level
+        size = side / n
+
+        xmin, xmax, ymin, ymax = view_extent
+
+        tx0 = max(floor((xmin - left) / size), 0)
+        tx1 = min(floor((xmax - left) / size), n - 1)
+        ty0 = max(floor((top - ymax) / size), 0)
+        ty1 = min(floor((top - ymin) / size), n - 1)
+
+        return [(tx, ty)
+                for ty in range(ty0, ty1 + 1)
+                for tx in range(tx0, tx1 + 1)]
+
+
+class PyramidSignals(QObject):
+    """Defines the signals available from a running pyramid job.
+
+    Supported signals are:
+
+    finished
+        returns no data
+    """
+
+    finished = pyqtSignal()
+
+
+class PyramidBuilder:
+    """Run chaos game once and build pyramid from the result."""
+
+    def __init__(self, worker, pyramid: TilePyramid, cnt: int, rel, levels: int,
+                 settings=None):
+        """Remember job settings.
+
+        Args:
+            worker (Worker2D): configured worker
+            pyramid (TilePyramid): pyramid to build
+            cnt (int): number of iterations
+            rel (float): relation for segment division
+            levels (int): deepest level to build
+            settings (dict, optional): JSON serializable parameters the
+                worker was configured from, kept in manifest for focused
+                runs. Defaults to None.
+        """
+        self.signals = PyramidSignals()
+
+        self.worker = worker
+        self.pyramid = pyramid
+        self.cnt = cnt
+        self.rel = rel
+        self.levels = levels
+        self.settings = settings
+
+    def cancel(self):
+        """Stop the game, nothing is built."""
+        self.worker.cancel()
+
+    def run(self):
+        """Run in Scheduler."""
+        x, y, indices = self.worker.work(self.cnt, rel=self.rel)
+        if self.worker.cancelled:
+            return
+
+        colors = self.worker.colorize(indices)
+
+        bounds = (self.worker.xmin, self.worker.xmax,
+                  self.worker.ymin, self.worker.ymax)
+        if not np.isfinite(bounds).all():
+            bounds = self.worker.guess_limits()
+
+        # Every vertex color is in palette, even if no point got it
+        self.pyramid.build(x, y, colors, bounds, self.levels,
+                           palette=self.worker.vertices_colors)
+
+        # Focused runs must color vertices the same way and play the game
+        # the pyramid was built from
+        self.pyramid.manifest['vertices_colors'] =\
+            list(self.worker.vertices_colors)
+        self.pyramid.manifest['settings'] = self.settings
+        self.pyramid.save_manifest()
+
+        self.signals.finished.emit()
+
+
+class PyramidLayer:
+    """Shows pyramid tiles on plot, loading only visible ones.
+
+    When view needs a level deeper than stored, coarser tiles are shown
+    and `refine(level, tiles)` is called to fill missing tiles.
+    """
+
+    def __init__(self, pyramid: TilePyramid, plot_item, refine=None):
+        """Attach to plot.
+
+        Args:
+            pyramid (TilePyramid): pyramid to show
+            plot_item (pg.PlotItem): plot to show on
+            refine (callable, optional): refine(level, tiles) fills
+                missing tiles. Defaults to None.
+        """
+        self.pyramid = pyramid
+        self.plot_item = plot_item
+        self.refine = refine
+
+        self.items = {}
+        # (level, tx, ty) of tiles being filled
+        self.pending = set()
+        self.palette_rgba = np.array([pg.mkColor(c).getRgb()
+                                      for c in pyramid.palette])
+
+        self.view_box = plot_item.getViewBox()
+        self.view_box.sigRangeChanged.connect(self.update)
+
+        self.update()
+
+    def detach(self):
+        """Remove tiles from plot and stop following view."""
+        self.view_box.sigRangeChanged.disconnect(self.update)
+
+        for item in self.items.values():
+            self.plot_item.removeItem(item)
+        self.items.clear()
+
+    def update(self, *_):
+        """Show tiles of the level that fits current view."""
+        (xmin, xmax), (ymin, ymax) = self.view_box.viewRange()
+        view_extent = (xmin, xmax, ymin, ymax)
+
+        level = self.pyramid.level_for(xmax - xmin, int(self.view_box.width()))
+        tiles = self.pyramid.visible(level, view_extent)
+
+        missing = [t for t in tiles if not self.pyramid.is_filled(level, *t)]
+        if missing:
+            # Tiles panned into are filled while others still are
+            new = [t for t in missing if (level, *t) not in self.pending]
+            if self.refine and new:
+                self.pending.update((level, *t) for t in new)
+                self.refine(level, new)
+
+            # Show the deepest level we have until refinement is done
+            while level > self.pyramid.levels and not all(
+                    self.pyramid.is_filled(level, *t) for t in tiles):
+                level -= 1
+                tiles = self.pyramid.visible(level, view_extent)
+
+        wanted = {(level, tx, ty) for tx, ty in tiles}
+
+        for key in list(self.items):
+            if key not in wanted:
+                self.plot_item.removeItem(self.items.pop(key))
+
+        for key in wanted - self.items.keys():
+            counts = self.pyramid.load(*key)
+            if counts is None:
+                continue
+
+            image = shade(counts, self.palette_rgba, self.pyramid.norm(level))
+
+            # Row-major image goes bottom up in view
+            item = pg.ImageItem(image[::-1], axisOrder='row-major')
+            # Under absolute and borders
+            item.setZValue(-1)
+            tile_xmin, tile_xmax, tile_ymin, tile_ymax =\
+                self.pyramid.tile_extent(*key)
+            item.setRect(QRectF(tile_xmin, tile_ymin,
+                                tile_xmax - tile_xmin, tile_ymax - tile_ymin))
+
+            self.plot_item.addItem(item)
+            self.items[key] = item
+
+    def refined(self, level: int, tiles: list):
+        """Refinement of tiles of level is done, show them."""
+        self.pending.difference_update((level, *t) for t in tiles)
+
+        for key in [k for k in self.items if k[0] != level]:
+            self.plot_item.removeItem(self.items.pop(key))
+
+        self.update()
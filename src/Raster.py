@@ -0,0 +1,329 @@
+"""Rasterization of chaos game points with numpy only."""
+
+import numpy as np
+
+
+def color_index(colors) -> tuple[np.ndarray, np.ndarray]:
+    """Split per point colors into palette and per point index.
+
+    Args:
+        colors (np.ndarray): color of every point, e.g. '#00406b'
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: palette and index of every
+            point's color in it
+    """
+    palette, index = np.unique(np.asarray(colors), return_inverse=True)
+
+    return palette, index.reshape(-1)
+
+
+def palette_index(colors, palette) -> np.ndarray:
+    """Index of every point's color in sorted palette.
+
+    Args:
+        colors (np.ndarray): color of every point
+        palette (list): sorted colors, e.g. from `color_index`
+
+    Returns:
+        np.ndarray: indices
+    """
+    return np.searchsorted(np.asarray(palette), np.asarray(colors))
+
+
+def to_pixels(x, y, extent, width: int, height: int):
+    """Map plane coordinates to pixel indices.
+
+    Row 0 is the top of the image, i.e. ymax.
+
+    Args:
+        x (np.ndarray): x coordinates
+        y (np.ndarray): y coordinates
+        extent (tuple): xmin, xmax, ymin, ymax covered by the image
+        width (int): image width in pixels
+        height (int): image height in pixels
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: rows, columns and mask
+            of points that fall on the image
+    """
+    xmin, xmax, ymin, ymax = extent
+
+    cols = np.floor((np.asarray(x) - xmin) * (width / (xmax - xmin)))
+    rows = np.floor((ymax - np.asarray(y)) * (height / (ymax - ymin)))
+
+    mask = (cols >= 0) & (cols < width) & (rows >= 0) & (rows < height)
+
+    return rows.astype(np.int64), cols.astype(np.int64), mask
+
+
+def disk(radius: float) -> tuple[np.ndarray, np.ndarray]:
+    """Pixel offsets covered by a disk of given radius.
+
+    Args:
+        radius (float): radius in pixels, at most 0.5 means single pixel
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: row and column offsets
+    """
+    r = max(int(np.ceil(radius - 0.5)), 0)
+
+    d_rows, d_cols = np.mgrid[-r:r + 1, -r:r + 1]
+    inside = d_rows**2 + d_cols**2 <= max(radius, 0.5)**2
+
+    return d_rows[inside], d_cols[inside]
+
+
+def stamp(out, rows, cols, rgba, radius=0.5) -> np.ndarray:
+    """Draw disks with given centers on image in place.
+
+    Args:
+        out (np.ndarray): (height, width, 4) uint8 image
+        rows (np.ndarray): rows of centers
+        cols (np.ndarray): columns of centers
+        rgba (np.ndarray): (n, 4) or (4,) uint8 colors
+        radius (float, optional): disk radius in pixels. Defaults to 0.5.
+
+    Returns:
+        np.ndarray: out
+    """
+    height, width = out.shape[:2]
+    rgba = np.asarray(rgba, dtype=np.uint8)
+
+    for d_row, d_col in zip(*disk(radius), strict=True):
+        cur_rows = rows + d_row
+        cur_cols = cols + d_col
+
+        mask = (cur_cols >= 0) & (cur_cols < width)\
+            & (cur_rows >= 0) & (cur_rows < height)
+
+        out[cur_rows[mask], cur_cols[mask]] =\
+            rgba[mask] if rgba.ndim > 1 else rgba
+
+    return out
+
+
+def rasterize(
+    x,
+    y,
+    index,
+    palette_rgba,
+    extent,
+    width: int,
+    height: int,
+    radius=0.5,
+    out=None,
+) -> np.ndarray:
+    """Draw points as disks on transparent RGBA image.
+
+    Points are drawn in order, so later points cover earlier ones as
+    in scatter plot.
+
+    Args:
+        x (np.ndarray): x coordinates
+        y (np.ndarray): y coordinates
+        index (np.ndarray): index of every point's color in palette
+        palette_rgba (np.ndarray): (k, 4) uint8 colors
+        extent (tuple): xmin, xmax, ymin, ymax covered by the image
+        width (int): image width in pixels
+        height (int): image height in pixels
+        radius (float, optional): point radius in pixels. Defaults to 0.5.
+        out (np.ndarray, optional): image to draw on. Defaults to None.
+
+    Returns:
+        np.ndarray: (height, width, 4) uint8 image
+    """
+    if out is None:
+        out = np.zeros((height, width, 4), dtype=np.uint8)
+
+    palette_rgba = np.asarray(palette_rgba, dtype=np.uint8)
+
+    rows, cols, _ = to_pixels(x, y, extent, width, height)
+
+    return stamp(out, rows, cols, palette_rgba[np.asarray(index)], radius)
+
+
+def clip_segments(x0, y0, x1, y1, box):
+    """Clip segments by rectangle, Liang–Barsky algorithm.
+
+    Args:
+        x0 (np.ndarray): x of segments' starts
+        y0 (np.ndarray): y of segments' starts
+        x1 (np.ndarray): x of segments' ends
+        y1 (np.ndarray): y of segments' ends
+        box (tuple): xmin, xmax, ymin, ymax
+
+    Returns:
+        tuple: clipped x0, y0, x1, y1 of segments that intersect box
+    """
+    xmin, xmax, ymin, ymax = box
+
+    dx = x1 - x0
+    dy = y1 - y0
+
+    t0 = np.zeros_like(x0)
+    t1 = np.ones_like(x0)
+    keep = np.ones(x0.shape, dtype=bool)
+
+    for p, q in ((-dx, x0 - xmin), (dx, xmax - x0),
+                 (-dy, y0 - ymin), (dy, ymax - y0)):
+        parallel = p == 0
+        keep &= ~(parallel & (q < 0))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = q / p
+
+        t0 = np.where(~parallel & (p < 0), np.maximum(t0, r), t0)
+        t1 = np.where(~parallel & (p > 0), np.minimum(t1, r), t1)
+
+    keep &= t0 <= t1
+
+    x0, y0, dx, dy = x0[keep], y0[keep], dx[keep], dy[keep]
+    t0, t1 = t0[keep], t1[keep]
+
+    return x0 + t0 * dx, y0 + t0 * dy, x0 + t1 * dx, y0 + t1 * dy
+
+
+def polyline(
+    xs,
+    ys,
+    rgba,
+    extent,
+    width: int,
+    height: int,
+    line_width=1.0,
+    out=None,
+) -> np.ndarray:
+    """Draw polyline on RGBA image.
+
+    Args:
+        xs (np.ndarray): x coordinates of polyline vertices
+        ys (np.ndarray): y coordinates of polyline vertices
+        rgba (np.ndarray): (4,) uint8 color
+        extent (tuple): xmin, xmax, ymin, ymax covered by the image
+        width (int): image width in pixels
+        height (int): image height in pixels
+        line_width (float, optional): width in pixels. Defaults to 1.0.
+        out (np.ndarray, optional): image to draw on. Defaults to None.
+
+    Returns:
+        np.ndarray: (height, width, 4) uint8 image
+    """
+    if out is None:
+        out = np.zeros((height, width, 4), dtype=np.uint8)
+
+    xmin, xmax, ymin, ymax = extent
+
+    # Pixel coordinates, row 0 is the top
+    px = (np.asarray(xs, dtype=float) - xmin) * (width / (xmax - xmin))
+    py = (ymax - np.asarray(ys, dtype=float)) * (height / (ymax - ymin))
+
+    pad = line_width + 1
+    x0, y0, x1, y1 = clip_segments(px[:-1], py[:-1], px[1:], py[1:],
+                                   (-pad, width + pad, -pad, height + pad))
+
+    # Sample every segment with step at most half a pixel
+    counts = np.ceil(2 * np.hypot(x1 - x0, y1 - y0)).astype(np.int64) + 1
+    seg = np.repeat(np.arange(len(counts)), counts)
+    starts = np.cumsum(counts) - counts
+    t = (np.arange(len(seg)) - starts[seg]) / np.maximum(counts[seg] - 1, 1)
+
+    cols = np.floor(x0[seg] + t * (x1 - x0)[seg]).astype(np.int64)
+    rows = np.floor(y0[seg] + t * (y1 - y0)[seg]).astype(np.int64)
+
+    return stamp(out, rows, cols, rgba, radius=line_width / 2)
+
+
+def render(
+    x,
+    y,
+    index,
+    palette_rgba,
+    extent,
+    width: int,
+    height: int,
+    radius=0.5,
+    lines=(),
+) -> np.ndarray:
+    """Draw points and polylines on white image.
+
+    Args:
+        x (np.ndarray): x coordinates
+        y (np.ndarray): y coordinates
+        index (np.ndarray): index of every point's color in palette
+        palette_rgba (np.ndarray): (k, 4) uint8 colors
+        extent (tuple): xmin, xmax, ymin, ymax covered by the image
+        width (int): image width in pixels
+        height (int): image height in pixels
+        radius (float, optional): point radius in pixels. Defaults to 0.5.
+        lines (list, optional): tuples (xs, ys, rgba, line width in
+            pixels) drawn over points. Defaults to ().
+
+    Returns:
+        np.ndarray: (height, width, 4) uint8 image
+    """
+    image = np.full((height, width, 4), 255, dtype=np.uint8)
+
+    rasterize(x, y, index, palette_rgba, extent, width, height,
+              radius=radius, out=image)
+
+    for xs, ys, rgba, line_width in lines:
+        polyline(xs, ys, rgba, extent, width, height,
+                 line_width=line_width, out=image)
+
+    return image
+
+
+def density(x, y, index, colors: int, extent, width: int, height: int):
+    """Count points of every color in every pixel.
+
+    Args:
+        x (np.ndarray): x coordinates
+        y (np.ndarray): y coordinates
+        index (np.ndarray): index of every point's color
+        colors (int): number of colors
+        extent (tuple): xmin, xmax, ymin, ymax covered by the image
+        width (int): image width in pixels
+        height (int): image height in pixels
+
+    Returns:
+        np.ndarray: (colors, height, width) uint32 counts
+    """
+    rows, cols, mask = to_pixels(x, y, extent, width, height)
+
+    flat = (np.asarray(index)[mask] * height + rows[mask]) * width + cols[mask]
+    counts = np.bincount(flat, minlength=colors * height * width)
+
+    return counts.astype(np.uint32).reshape(colors, height, width)
+
+
+def shade(counts, palette_rgba, norm=None) -> np.ndarray:
+    """Turn per color counts into RGBA image.
+
+    Color of pixel is the mix of colors weighted by counts, opacity grows
+    with logarithm of total count.
+
+    Args:
+        counts (np.ndarray): (k, h, w) counts, see `density`
+        palette_rgba (np.ndarray): (k, 4) uint8 colors
+        norm (float, optional): count that gives full opacity.
+            Defaults to maximum of counts.
+
+    Returns:
+        np.ndarray: (h, w, 4) uint8 image
+    """
+    counts = np.asarray(counts, dtype=np.float32)
+    palette = np.asarray(palette_rgba, dtype=np.float32)
+
+    total = counts.sum(axis=0)
+    if norm is None:
+        norm = total.max(initial=1)
+
+    image = np.zeros((*total.shape, 4), dtype=np.float32)
+    image[..., :3] = np.tensordot(counts, palette[:, :3], axes=(0, 0))
+    image[..., :3] /= np.maximum(total, 1)[..., None]
+
+    level = np.log1p(total) / np.log1p(max(norm, 1))
+    image[..., 3] = np.where(total > 0, 255 * np.clip(0.3 + 0.7 * level, 0, 1), 0)
+
+    return np.round(image).astype(np.uint8)
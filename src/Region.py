@@ -0,0 +1,125 @@
+"""Regions where points of the game are kept, checked on coordinate arrays.
+
+Region file is loaded like strategies. It defines
+
+    def region(x: np.ndarray, y: np.ndarray) -> np.ndarray
+
+returning boolean mask of points inside, or one point `checker(p)` that
+is then called for every point.
+"""
+
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+
+from Point import Point2
+
+
+class Region:
+    """Predicate on coordinate arrays, combined with `&` and `|`."""
+
+    def __init__(self, mask, point=None):
+        """Wrap predicate.
+
+        Args:
+            mask (Callable): x, y arrays -> boolean mask
+            point (Callable, optional): Point3 -> bool, faster for one
+                point. Defaults to None, i.e. mask of one point.
+        """
+        self.mask = mask
+        self.point = point
+
+    def __call__(self, x, y) -> np.ndarray:
+        """Mask of points inside.
+
+        Args:
+            x (np.ndarray): x coordinates
+            y (np.ndarray): y coordinates
+
+        Returns:
+            np.ndarray: boolean mask, a new array
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+
+        return np.broadcast_to(self.mask(x, y), x.shape).astype(bool)
+
+    def __and__(self, other: 'Region') -> 'Region':
+        """Inside both, other is checked only where self holds."""
+        def mask(x, y):
+            result = self(x, y)
+            if result.any():
+                result[result] = other(x[result], y[result])
+
+            return result
+
+        return Region(mask, lambda p: self.contains(p) and other.contains(p))
+
+    def __or__(self, other: 'Region') -> 'Region':
+        """Inside either, other is checked only where self fails."""
+        def mask(x, y):
+            result = self(x, y)
+            rest = ~result
+            if rest.any():
+                result[rest] = other(x[rest], y[rest])
+
+            return result
+
+        return Region(mask, lambda p: self.contains(p) or other.contains(p))
+
+    def contains(self, point) -> bool:
+        """One point version, fits Worker2D.checker.
+
+        Args:
+            point (Point3): point to check
+
+        Returns:
+            bool: point is inside
+        """
+        if self.point is not None:
+            return self.point(point)
+
+        cur = point.to_lower_dimension().to_float()
+        result = self.mask(np.array([float(cur[1])]), np.array([float(cur[2])]))
+
+        return bool(np.ravel(result)[0])
+
+
+def load_region(path) -> Region:
+    """Load region from file.
+
+    Args:
+        path (str | Path): file with region(x, y) or checker(p)
+
+    Raises:
+        ValueError: file has neither
+
+    Returns:
+        Region: region of the file
+    """
+    path = Path(path)
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    if hasattr(module, 'region'):
+        return Region(module.region)
+
+    if hasattr(module, 'checker'):
+        checker = module.checker
+
+        def mask(x, y):
+            return np.fromiter((checker(Point2(a, b))
+                                for a, b in zip(x.tolist(), y.tolist(), strict=True)),
+                               dtype=bool, count=len(x))
+
+        def point(p):
+            cur = p.to_lower_dimension().to_float()
+
+            return checker(Point2(cur[1], cur[2]))
+
+        return Region(mask, point)
+
+    msg = f'{path}: neither region(x, y) nor checker(p) is defined'
+    raise ValueError(msg)
@@ -0,0 +1,114 @@
+"""Application wide pool of background jobs."""
+
+import os
+
+from pyqtgraph.Qt.QtCore import QRunnable, QThreadPool
+
+# Higher runs first when all threads are busy
+INTERACTIVE = 2
+REFINE = 1
+BACKGROUND = 0
+
+
+class Task(QRunnable):
+    """Runs job in pool, job itself stays owned by Python."""
+
+    def __init__(self, job):
+        """Wrap job.
+
+        Args:
+            job: object with run() and, optionally, cancel()
+        """
+        super().__init__()
+        self.setAutoDelete(False)
+
+        self.job = job
+        self.done = False
+
+    def run(self):
+        """Run job."""
+        try:
+            self.job.run()
+        finally:
+            self.done = True
+
+
+class Scheduler:
+    """Single thread pool for all computations and exports.
+
+    Number of threads is the number of cores. Job submitted with a key
+    supersedes the previous job with the same key: it is removed from the
+    queue if not started yet, otherwise asked to stop with `cancel()`.
+    """
+
+    def __init__(self, threads=None):
+        """Create pool.
+
+        Args:
+            threads (int, optional): maximum number of threads.
+                Defaults to number of cores.
+        """
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(threads or os.cpu_count() or 1)
+
+        self.tasks = []
+        self.keys = {}
+
+    def submit(self, job, priority=BACKGROUND, key=None):
+        """Queue job.
+
+        Args:
+            job: object with run() and, optionally, cancel()
+            priority (int, optional): INTERACTIVE, REFINE or BACKGROUND.
+                Defaults to BACKGROUND.
+            key (str, optional): job with the same key is cancelled.
+                Defaults to None.
+        """
+        if key is not None:
+            self.cancel(key)
+
+        # Tasks are kept until finished, Qt doesn't own them
+        self.tasks = [t for t in self.tasks if not t.done]
+
+        task = Task(job)
+        self.tasks.append(task)
+        if key is not None:
+            self.keys[key] = task
+
+        self.pool.start(task, priority)
+
+    def cancel(self, key):
+        """Cancel job submitted with key.
+
+        Args:
+            key (str): key of the job
+        """
+        task = self.keys.pop(key, None)
+        if task is None or task.done:
+            return
+
+        if self.pool.tryTake(task):
+            task.done = True
+        elif cancel := getattr(task.job, 'cancel', None):
+            cancel()
+
+    def cancel_all(self):
+        """Cancel every job, e.g. on exit."""
+        for key in list(self.keys):
+            self.cancel(key)
+
+        for task in self.tasks:
+            if not task.done and not self.pool.tryTake(task)\
+                    and (cancel := getattr(task.job, 'cancel', None)):
+                cancel()
+
+    def wait(self, msecs=-1) -> bool:
+        """Wait for running jobs.
+
+        Args:
+            msecs (int, optional): timeout. Defaults to no timeout.
+
+        Returns:
+            bool: all jobs finished
+        """
+        return self.pool.waitForDone(msecs)
@@ -0,0 +1,87 @@
+"""Counters and timings of chaos game runs."""
+
+from dataclasses import asdict, dataclass, field, replace
+from time import perf_counter
+
+BRANCHES = ('elliptic', 'parabolic', 'hyperbolic')
+
+
+@dataclass
+class RunStats:
+    """What happened during the run.
+
+    Every step is either accepted or rejected for one reason: checker said
+    the point is on the wrong side, division gave non-finite point, or the
+    point is outside limits.
+    """
+
+    steps: int = 0
+    accepted: int = 0
+    rejected_checker: int = 0
+    rejected_nonfinite: int = 0
+    rejected_bounds: int = 0
+    # Points accepted, but outside of the recorded window
+    outside_window: int = 0
+    # Chains started again from a new point after too many rejections
+    restarts: int = 0
+    # Calls of div_in_rel by sign of phi_big
+    branches: dict = field(default_factory=lambda: dict.fromkeys(BRANCHES, 0))
+    # Why the run ended before all iterations, e.g. 'converged'
+    stopped: str = ''
+    elapsed: float = 0.0
+    started: float = field(default=0.0, repr=False)
+
+    def start(self):
+        """Start timing."""
+        self.started = perf_counter()
+
+    def stop(self):
+        """Add time since start to elapsed."""
+        if self.started:
+            self.elapsed += perf_counter() - self.started
+            self.started = 0.0
+
+    def snapshot(self) -> 'RunStats':
+        """Copy with elapsed time up to now, safe to send to other thread."""
+        elapsed = self.elapsed
+        if self.started:
+            elapsed += perf_counter() - self.started
+
+        return replace(self, branches=dict(self.branches),
+                       elapsed=elapsed, started=0.0)
+
+    @property
+    def steps_per_second(self) -> float:
+        """Speed of the run."""
+        return self.steps / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def acceptance_rate(self) -> float:
+        """Part of steps that moved the chain."""
+        return self.accepted / self.steps if self.steps else 0.0
+
+    def to_dict(self) -> dict:
+        """Counters and derived values, e.g. for logging as JSON."""
+        data = asdict(self)
+        data.pop('started')
+        data['steps_per_second'] = self.steps_per_second
+        data['acceptance_rate'] = self.acceptance_rate
+
+        return data
+
+    def summary(self) -> str:
+        """Multiline human readable summary."""
+        branches = ', '.join(f'{name} {cnt}'
+                             for name, cnt in self.branches.items())
+
+        return '\n'.join([
+            f'steps: {self.steps} ({self.steps_per_second:.0f}/s)',
+            f'accepted: {self.accepted} ({100 * self.acceptance_rate:.1f}%)',
+            f'rejected: checker {self.rejected_checker}, '
+            f'non-finite {self.rejected_nonfinite}, '
+            f'bounds {self.rejected_bounds}',
+            f'outside window: {self.outside_window}',
+            f'restarts: {self.restarts}',
+            f'branches: {branches}',
+            f'time: {self.elapsed:.2f} s',
+        ] + ([f'stopped: {self.stopped}'] if self.stopped else []))
@@ -0,0 +1,289 @@
+"""Points on disk: memory-mapped `.npy` shards and a JSON manifest.
+
+Runs larger than RAM write points shard by shard, readers go through
+shards in chunks with `np.memmap`, so memory is bounded by a chunk.
+
+    directory/
+        manifest.json
+        00000_x.npy  00000_y.npy  00000_indices.npy
+        00001_x.npy  ...
+"""
+
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+VERSION = 1
+
+MANIFEST = 'manifest.json'
+
+# Points in a shard, the last one may be shorter
+SHARD_SIZE = 2**22
+
+
+class ShardWriter:
+    """Appends columns of points to shards."""
+
+    def __init__(self, directory, shard_size=SHARD_SIZE, meta=None):
+        """Start empty store, existing shards in directory are replaced.
+
+        Args:
+            directory (str | Path): where to write
+            shard_size (int, optional): points in a shard.
+                Defaults to SHARD_SIZE.
+            meta (dict, optional): JSON serializable data kept in
+                manifest, e.g. colors of vertices. Defaults to None.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        for path in self.directory.glob('*.npy'):
+            path.unlink()
+
+        self.shard_size = shard_size
+        self.meta = meta or {}
+
+        # name -> dtype, taken from the first append
+        self.columns = {}
+        self.lengths = []
+
+        # Memory maps of the shard being filled
+        self.shard = {}
+        self.filled = 0
+
+    def __len__(self) -> int:
+        """Number of points written."""
+        return sum(self.lengths) + self.filled
+
+    def path(self, shard: int, name: str) -> Path:
+        """File of column of shard."""
+        return self.directory / f'{shard:05d}_{name}.npy'
+
+    def append(self, **arrays):
+        """Append points.
+
+        Args:
+            **arrays (np.ndarray): every column, of the same length
+        """
+        if not self.columns:
+            self.columns = {name: np.asarray(values).dtype.str
+                            for name, values in arrays.items()}
+
+        size = len(next(iter(arrays.values())))
+        start = 0
+        while start < size:
+            if not self.shard:
+                self.open_shard()
+
+            end = min(start + self.shard_size - self.filled, size)
+            for name, values in arrays.items():
+                self.shard[name][self.filled:self.filled + end - start] =\
+                    values[start:end]
+
+            self.filled += end - start
+            start = end
+
+            if self.filled == self.shard_size:
+                self.close_shard()
+
+    def open_shard(self):
+        """Create memory maps of the next shard."""
+        shard = len(self.lengths)
+        self.shard = {
+            name: np.lib.format.open_memmap(self.path(shard, name), mode='w+',
+                                            dtype=dtype,
+                                            shape=(self.shard_size,))
+            for name, dtype in self.columns.items()
+        }
+        self.filled = 0
+
+    def close_shard(self):
+        """Flush shard being filled, a shorter one is trimmed."""
+        shard = len(self.lengths)
+
+        while self.shard:
+            name, data = self.shard.popitem()
+            data.flush()
+
+            if self.filled < self.shard_size:
+                part = np.array(data[:self.filled])
+                # File can't be rewritten while mapped on some systems
+                del data
+                np.save(self.path(shard, name), part)
+
+        self.lengths.append(self.filled)
+        self.filled = 0
+
+        # Readers can follow a run that isn't finished
+        self.save_manifest()
+
+    def save_manifest(self):
+        """Write manifest of closed shards."""
+        manifest = {
+            'version': VERSION,
+            'columns': self.columns,
+            'shards': self.lengths,
+            'length': sum(self.lengths),
+            'meta': self.meta,
+        }
+
+        path = self.directory / MANIFEST
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(manifest, indent=4), encoding='utf-8')
+        os.replace(tmp, path)
+
+    def close(self) -> 'PointStore':
+        """Finish writing.
+
+        Returns:
+            PointStore: reader of written points
+        """
+        if self.shard:
+            self.close_shard()
+        else:
+            self.save_manifest()
+
+        return PointStore(self.directory)
+
+
+class PointStore:
+    """Reads points written by ShardWriter."""
+
+    def __init__(self, directory):
+        """Read manifest.
+
+        Args:
+            directory (str | Path): store directory
+
+        Raises:
+            ValueError: no manifest or manifest of other version
+        """
+        self.directory = Path(directory)
+
+        path = self.directory / MANIFEST
+        if not path.exists():
+            raise ValueError(f'{directory} has no {MANIFEST}')
+
+        manifest = json.loads(path.read_text(encoding='utf-8'))
+        if manifest.get('version') != VERSION:
+            raise ValueError(f'{path} has unsupported version')
+
+        self.columns = manifest['columns']
+        self.lengths = manifest['shards']
+        self.meta = manifest['meta']
+
+    def __len__(self) -> int:
+        """Number of points."""
+        return sum(self.lengths)
+
+    def shard(self, shard: int, *names) -> tuple[np.memmap, ...]:
+        """Columns of shard mapped into memory, nothing is read yet."""
+        return tuple(
+            np.load(self.directory / f'{shard:05d}_{name}.npy', mmap_mode='r')
+            for name in names or self.columns
+        )
+
+    def chunks(self, *names, size=SHARD_SIZE):
+        """Iterate over points in chunks.
+
+        Args:
+            *names (str): columns, all by default
+            size (int, optional): points in chunk at most.
+                Defaults to SHARD_SIZE.
+
+        Yields:
+            tuple[np.ndarray, ...]: columns of chunk, views of memory maps
+        """
+        for shard, length in enumerate(self.lengths):
+            if not length:
+                continue
+
+            columns = self.shard(shard, *names)
+            for start in range(0, length, size):
+                yield tuple(c[start:start + size] for c in columns)
+
+    def load(self, *names) -> tuple[np.ndarray, ...]:
+        """Whole columns in memory, for stores that fit in it.
+
+        Args:
+            *names (str): columns, all by default
+
+        Returns:
+            tuple[np.ndarray, ...]: columns
+        """
+        names = names or tuple(self.columns)
+        parts = list(self.chunks(*names))
+        if not parts:
+            return tuple(np.empty(0, dtype=self.columns.get(name, float))
+                         for name in names)
+
+        return tuple(np.concatenate(columns)
+                     for columns in zip(*parts, strict=True))
+
+
+class Partition:
+    """Points of store split into buckets on disk in one pass.
+
+    Every bucket is then read on its own, so memory is bounded by a bucket,
+    not by the store. Bucket files are removed on close.
+    """
+
+    def __init__(self, store: PointStore, bucket_of, buckets: int,
+                 names=None, directory=None):
+        """Split points.
+
+        Args:
+            store (PointStore): points to split
+            bucket_of (Callable): columns of chunk -> bucket of every point,
+                points out of 0..buckets - 1 are dropped
+            buckets (int): number of buckets
+            names (tuple, optional): columns to keep, all by default
+            directory (str | Path, optional): where to put bucket files,
+                system temporary directory by default
+        """
+        self.names = tuple(names or store.columns)
+        self.dtypes = [np.dtype(store.columns[name]) for name in self.names]
+        self.buckets = buckets
+        self.tmp = tempfile.TemporaryDirectory(dir=directory)
+
+        for columns in store.chunks(*self.names):
+            bucket = np.asarray(bucket_of(*columns))
+            order = np.argsort(bucket, kind='stable')
+            bounds = np.searchsorted(bucket[order], np.arange(buckets + 1))
+
+            for idx in np.flatnonzero(np.diff(bounds)):
+                part = order[bounds[idx]:bounds[idx + 1]]
+                for name, column in zip(self.names, columns, strict=True):
+                    with self.path(idx, name).open('ab') as f:
+                        column[part].tofile(f)
+
+    def __enter__(self) -> 'Partition':
+        """Use as context manager, files are removed on exit."""
+        return self
+
+    def __exit__(self, *_):
+        """Remove bucket files."""
+        self.close()
+
+    def path(self, bucket: int, name: str) -> Path:
+        """File of column of bucket."""
+        return Path(self.tmp.name) / f'{bucket:05d}_{name}.bin'
+
+    def get(self, *buckets) -> tuple[np.ndarray, ...]:
+        """Columns of buckets in memory, in order of buckets."""
+        columns = []
+        for name, dtype in zip(self.names, self.dtypes, strict=True):
+            parts = [np.fromfile(path, dtype=dtype) for bucket in buckets
+                     if 0 <= bucket < self.buckets
+                     and (path := self.path(bucket, name)).exists()]
+            columns.append(np.concatenate(parts) if parts
+                           else np.empty(0, dtype=dtype))
+
+        return tuple(columns)
+
+    def close(self):
+        """Remove bucket files."""
+        self.tmp.cleanup()
@@ -0,0 +1,300 @@
+"""Tiled output for images that don't fit in memory.
+
+Image is split into tiles, points are partitioned by tile once, and every
+tile is rasterized and written on its own, so memory is bounded by a tile.
+"""
+
+import json
+import struct
+import zlib
+from math import ceil
+from pathlib import Path
+
+import numpy as np
+
+from Raster import to_pixels
+
+
+class TileGrid:
+    """Split of image with given extent into square tiles."""
+
+    def __init__(self, extent, width: int, height: int, tile: int):
+        """Initialize grid.
+
+        Args:
+            extent (tuple): xmin, xmax, ymin, ymax covered by the image
+            width (int): image width in pixels
+            height (int): image height in pixels
+            tile (int): tile size in pixels
+        """
+        self.extent = extent
+        self.width = width
+        self.height = height
+        self.tile = tile
+
+        self.rows = ceil(height / tile)
+        self.cols = ceil(width / tile)
+
+    def __iter__(self):
+        """Iterate over (row, col) of tiles, row by row."""
+        for row in range(self.rows):
+            for col in range(self.cols):
+                yield row, col
+
+    def shape(self, row: int, col: int) -> tuple[int, int]:
+        """Size of tile without padding, edge tiles may be smaller.
+
+        Returns:
+            tuple[int, int]: height, width
+        """
+        return (min(self.tile, self.height - row * self.tile),
+                min(self.tile, self.width - col * self.tile))
+
+    def tile_extent(self, row: int, col: int) -> tuple:
+        """Plane coordinates covered by full size tile.
+
+        Returns:
+            tuple: xmin, xmax, ymin, ymax
+        """
+        xmin, xmax, ymin, ymax = self.extent
+
+        dx = (xmax - xmin) * self.tile / self.width
+        dy = (ymax - ymin) * self.tile / self.height
+
+        return (xmin + col * dx, xmin + (col + 1) * dx,
+                ymax - (row + 1) * dy, ymax - row * dy)
+
+
+class TiledPoints:
+    """Points partitioned by tiles of the grid.
+
+    Points are stably sorted by tile, so order inside a tile is kept.
+    """
+
+    def __init__(self, grid: TileGrid, x, y, index):
+        """Partition points.
+
+        Args:
+            grid (TileGrid): grid to partition by
+            x (np.ndarray): x coordinates
+            y (np.ndarray): y coordinates
+            index (np.ndarray): index of every point's color
+        """
+        self.grid = grid
+
+        rows, cols, mask = to_pixels(x, y, grid.extent,
+                                     grid.width, grid.height)
+
+        keys = (rows[mask] // grid.tile) * grid.cols + cols[mask] // grid.tile
+        order = np.argsort(keys, kind='stable')
+
+        self.x = np.asarray(x)[mask][order]
+        self.y = np.asarray(y)[mask][order]
+        self.index = np.asarray(index)[mask][order]
+
+        self.bounds = np.searchsorted(keys[order],
+                                      np.arange(grid.rows * grid.cols + 1))
+
+    def get(self, row: int, col: int, margin=0):
+        """Points of tile and of `margin` tiles around it.
+
+        Args:
+            row (int): tile row
+            col (int): tile column
+            margin (int, optional): neighbours to include, for points
+                larger than a pixel. Defaults to 0.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: x, y, index
+        """
+        parts = []
+        for cur_row in range(max(row - margin, 0),
+                             min(row + margin + 1, self.grid.rows)):
+            left = cur_row * self.grid.cols + max(col - margin, 0)
+            right = cur_row * self.grid.cols\
+                + min(col + margin + 1, self.grid.cols)
+
+            parts.append(slice(self.bounds[left], self.bounds[right]))
+
+        idx = np.concatenate([np.arange(s.start, s.stop) for s in parts])
+
+        return self.x[idx], self.y[idx], self.index[idx]
+
+
+class TiffWriter:
+    """Streaming writer of tiled RGBA TIFF.
+
+    Tiles are written as soon as they are ready, directory goes to the end
+    of file. BigTIFF is used when the image may exceed 4 GB.
+    """
+
+    SHORT = 3
+    LONG = 4
+    LONG8 = 16
+
+    def __init__(self, path, width: int, height: int, tile: int,
+                 compress=True):
+        """Open file and write header.
+
+        Args:
+            path (str | Path): output file
+            width (int): image width in pixels
+            height (int): image height in pixels
+            tile (int): tile size, multiple of 16
+            compress (bool, optional): deflate tiles. Defaults to True.
+        """
+        if tile % 16:
+            msg = 'TIFF tile size must be a multiple of 16'
+            raise ValueError(msg)
+
+        self.width = width
+        self.height = height
+        self.tile = tile
+        self.compress = compress
+
+        self.cols = ceil(width / tile)
+        self.rows = ceil(height / tile)
+        self.offsets = [0] * (self.rows * self.cols)
+        self.byte_counts = [0] * (self.rows * self.cols)
+
+        self.big = width * height * 4 > 2**32 - 2**24
+
+        self.file = Path(path).open('wb')
+        if self.big:
+            self.file.write(struct.pack('<2sHHHQ', b'II', 43, 8, 0, 0))
+        else:
+            self.file.write(struct.pack('<2sHI', b'II', 42, 0))
+
+    def write_tile(self, row: int, col: int, tile):
+        """Write tile, it is padded to full size if needed.
+
+        Args:
+            row (int): tile row
+            col (int): tile column
+            tile (np.ndarray): (h, w, 4) uint8 image
+        """
+        if tile.shape[:2] != (self.tile, self.tile):
+            full = np.zeros((self.tile, self.tile, 4), dtype=np.uint8)
+            full[:tile.shape[0], :tile.shape[1]] = tile
+            tile = full
+
+        data = np.ascontiguousarray(tile, dtype=np.uint8).tobytes()
+        if self.compress:
+            data = zlib.compress(data, 6)
+
+        idx = row * self.cols + col
+        self.offsets[idx] = self.file.tell()
+        self.byte_counts[idx] = len(data)
+
+        self.file.write(data)
+
+    def close(self):
+        """Write image file directory and close file."""
+        offset_type = self.LONG8 if self.big else self.LONG
+        tags = [
+            (256, self.LONG, [self.width]),
+            (257, self.LONG, [self.height]),
+            (258, self.SHORT, [8, 8, 8, 8]),
+            (259, self.SHORT, [8 if self.compress else 1]),
+            # RGB
+            (262, self.SHORT, [2]),
+            (277, self.SHORT, [4]),
+            # Chunky
+            (284, self.SHORT, [1]),
+            (322, self.LONG, [self.tile]),
+            (323, self.LONG, [self.tile]),
+            (324, offset_type, self.offsets),
+            (325, offset_type, self.byte_counts),
+            # Unassociated alpha
+            (338, self.SHORT, [2]),
+        ]
+
+        formats = {self.SHORT: 'H', self.LONG: 'I', self.LONG8: 'Q'}
+        field = 8 if self.big else 4
+
+        # Values that don't fit into entry go before directory
+        entries = []
+        for tag, kind, values in tags:
+            data = struct.pack(f'<{len(values)}{formats[kind]}', *values)
+
+            if len(data) <= field:
+                value = data.ljust(field, b'\0')
+            else:
+                self.__align()
+                value = struct.pack('<Q' if self.big else '<I',
+                                    self.file.tell())
+                self.file.write(data)
+
+            entries.append((tag, kind, len(values), value))
+
+        self.__align()
+        ifd_offset = self.file.tell()
+
+        if self.big:
+            self.file.write(struct.pack('<Q', len(entries)))
+            for tag, kind, count, value in entries:
+                self.file.write(struct.pack('<HHQ', tag, kind, count) + value)
+            self.file.write(struct.pack('<Q', 0))
+
+            self.file.seek(8)
+            self.file.write(struct.pack('<Q', ifd_offset))
+        else:
+            self.file.write(struct.pack('<H', len(entries)))
+            for tag, kind, count, value in entries:
+                self.file.write(struct.pack('<HHI', tag, kind, count) + value)
+            self.file.write(struct.pack('<I', 0))
+
+            self.file.seek(4)
+            self.file.write(struct.pack('<I', ifd_offset))
+
+        self.file.close()
+
+    def __align(self):
+        if self.file.tell() % 2:
+            self.file.write(b'\0')
+
+
+class MosaicWriter:
+    """Writer of image as separate PNG file per tile plus JSON manifest."""
+
+    def __init__(self, path, grid: TileGrid):
+        """Remember where to write.
+
+        Args:
+            path (str | Path): output file, tiles are named
+                <stem>_r<row>_c<col>.png
+            grid (TileGrid): grid of tiles
+        """
+        self.path = Path(path)
+        self.grid = grid
+        self.files = {}
+
+    def write_tile(self, row: int, col: int, tile):
+        """Write tile as PNG.
+
+        Args:
+            row (int): tile row
+            col (int): tile column
+            tile (np.ndarray): (h, w, 4) uint8 image
+        """
+        from PIL import Image
+
+        name = f'{self.path.stem}_r{row}_c{col}.png'
+        Image.fromarray(tile, 'RGBA').save(self.path.with_name(name))
+
+        self.files[f'{row},{col}'] = name
+
+    def close(self):
+        """Write manifest with grid layout."""
+        manifest = {
+            'width': self.grid.width,
+            'height': self.grid.height,
+            'tile': self.grid.tile,
+            'rows': self.grid.rows,
+            'cols': self.grid.cols,
+            'extent': list(self.grid.extent),
+            'tiles': self.files,
+        }
+
+        with self.path.with_suffix('.json').open('w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=4)
@@ -1,11 +1,39 @@
 """Widely used functions."""
 
+import sys
 from math import hypot, isclose
 from typing import Literal
 
-import mpmath as mp
+from Constants import DIGITS, PRECISION
 
-from Constants import PRECISION
+
+def load_mpmath():
+    """Import mpmath on demand and set project wide precision.
+
+    mpmath is heavy to import and is needed only for arbitrary-precision
+    coordinates, so it is not imported at startup. Use this function to
+    get the module when such coordinates are created.
+
+    Returns:
+        module: mpmath with ``mp.dps`` set to ``DIGITS``
+    """
+    import mpmath as mp
+
+    mp.mp.dps = DIGITS
+
+    return mp
+
+
+def loaded_mpmath():
+    """Return mpmath if somebody already imported it, otherwise None.
+
+    If mpmath is not imported, no value can be mpf/mpc, so type checks
+    may be skipped without importing it.
+
+    Returns:
+        module | None: mpmath or None
+    """
+    return sys.modules.get('mpmath')
 
 
 def distance(a, b) -> float:
@@ -46,7 +74,8 @@ def isclose_prec(a, b) -> bool:
     Returns:
         bool: is two values are close
     """
-    if isinstance(a, mp.mpf | mp.mpc):
+    mp = loaded_mpmath()
+    if mp is not None and isinstance(a, mp.mpf | mp.mpc):
         return mp.almosteq(a, b)
 
     return isclose(a, b, rel_tol=PRECISION)
@@ -58,7 +87,8 @@ def signum(x) -> Literal[-1, 1, 0]:
     Returns:
         {-1, 1, 0}: -1 if x < 0; 0 if x > 0; and 0 otherwise
     """
-    if isinstance(x, mp.mpf):
+    mp = loaded_mpmath()
+    if mp is not None and isinstance(x, mp.mpf):
         return mp.sign(x)
 
     if x < 0:
@@ -1,5 +1,8 @@
 from random import choice
 
+# Depends on this many previous vertices
+memory = 0
+
 
 # Choose random vertex
 def strategy(verticies: list, prev: list) -> int:
@@ -1,5 +1,8 @@
 from random import choice
 
+# Depends on this many previous vertices
+memory = 2
+
 
 # Choose random except 2 previous
 def strategy(verticies: list, prev: list) -> int:
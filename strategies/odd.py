@@ -1,5 +1,8 @@
 from random import choice
 
+# Depends on this many previous vertices
+memory = 0
+
 
 # Odd indexes (0, 1, 2, 3, 4, 5, ... -> 1, 3, 5, 7, ...)
 def strategy(verticies: list, prev: list) -> int:
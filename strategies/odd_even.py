@@ -1,5 +1,8 @@
 from random import choice
 
+# Depends on this many previous vertices
+memory = 1
+
 
 # Even -> Odd -> Even -> Odd
 def strategy(verticies: list, prev: list) -> int: